@@ -5,14 +5,48 @@ This code builds on the following projects:
 """
 
 import sys
+import os
 sys.path.append('.')
 sys.path.append('../../')
-import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import time
 import numpy as np
 import argparse
 import pathlib
-import colorsys
 import site
+import socket
+import collections
+import itertools
+import json
+import glob
+import hashlib
+import tempfile
+import shutil
+import signal
+import render_io
+import render_plan
+import render_queue
+import render_stats
+
+base_path = pathlib.Path(__file__).parent.absolute()
+
+INSIDE_BLENDER = True
+try:
+    import bpy, bpy_extras
+    from mathutils import Vector
+except ImportError as e:
+    INSIDE_BLENDER = False
+if INSIDE_BLENDER:
+    try:
+        import render_utils
+    except ImportError as e:
+        try:
+            print("Could not import render_utils.py; trying to hot patch it.")
+            site.addsitedir(base_path)
+            import render_utils
+        except ImportError as e:
+            print("\nERROR")
+            sys.exit(1)
 
 SPOT_POS=2
 SPOT_HUE=0
@@ -22,6 +56,55 @@ OBJECT_POS=[6,7,8]
 OBJECT_ROT=[4,5]
 OBJECT_TYPE=9
 
+# Cycles settings of the --quality profiles. production matches the settings
+# the datasets were rendered with.
+QUALITY_PROFILES = {
+    "draft": dict(
+        render_num_samples=32,
+        adaptive_threshold=0.1,
+        use_denoising=True,
+        denoiser="OPENIMAGEDENOISE",
+        render_min_bounces=2,
+        render_max_bounces=2,
+    ),
+    "preview": dict(
+        render_num_samples=128,
+        adaptive_threshold=0.03,
+        use_denoising=True,
+        denoiser="OPENIMAGEDENOISE",
+        render_min_bounces=4,
+        render_max_bounces=4,
+    ),
+    "production": dict(
+        render_num_samples=512,
+        adaptive_threshold=0.0,
+        use_denoising=True,
+        denoiser=None,
+        render_min_bounces=8,
+        render_max_bounces=8,
+    ),
+}
+
+# scene properties closer than this to their current value are not written again
+UPDATE_TOLERANCE = 1e-6
+
+# per-stage timings of the render loop, enabled with --timing-log
+timer = render_stats.StageTimer(enabled=False)
+
+# images of previously rendered scenes, enabled with --render-cache
+render_cache = None
+
+# background image encoding and writing, enabled with --async-write
+image_writer = None
+
+# render plan fields that determine the image, see render_key
+RENDER_KEY_FIELDS = ("shape", "location", "rotation", "color", "light_color", "light_location", "background")
+
+# a latent row holds 3 scene latents followed by 7 latents per object, stored
+# factor by factor: hues, alpha angles, beta angles, x, y, z, object types
+N_SCENE_LATENTS=3
+N_OBJECT_LATENTS=7
+
 SHAPE_DICT={0:"Teapot",
             1:"Armardillo",
             2:"Bunny",
@@ -36,66 +119,830 @@ SHAPE_DICT={0:"Teapot",
 
 def main(args):
 
+    if args.output_folder is None:
+        raise ValueError("--output-folder is required unless --daemon-spool is given")
+
     # defining output folder from given path
     args.output_folder = pathlib.Path(args.output_folder).absolute()
 
-    # loading generative factors
-    latents_path = os.path.join(args.output_folder, "latents.npy")
-    if not os.path.exists(latents_path):
-        raise ValueError("Latents could not be found; run latent generation first")
-    latents = np.load(latents_path)
-    n_samples = latents.shape[0]
-    n_object = ((latents.shape[1]-3) // 7) 
-    n_diff_object = len(list(np.unique(latents[:,-1])))
-
-    # setting the material name
-    if args.material_names is None:
-        args.material_names = ["Rubber"] * n_object 
-    elif args.material_names in ["Rubber","Crystal","Metallic"]: 
-        args.material_names = args.material_names * n_object
-    elif isinstance(args.material_names,list) and len(args.material_names) == n_object: 
-        pass
-    else: assert NotImplementedError("Material name should Rubber, Metallic or Crystal")
+    views = load_views(args)
+    n_samples = views[0].latents.shape[0]
 
     # defining instance number for given batch
     indices = np.array_split(np.arange(n_samples), args.n_batches)[args.batch_index]
     print(f"Rendering samples in range: {min(indices)} - {max(indices)}")
 
-    # defining image folder
-    output_image_folder = os.path.join(args.output_folder, "images")
+    # the scene is only rebuilt when the shapes of consecutive samples differ
+    scene_cache = make_scene_cache(args)
+
+    render_indices(
+        views,
+        indices,
+        args,
+        scene_cache,
+        writer=f"batch_{args.batch_index:04d}",
+    )
+
+
+def serve(args):
+    """Daemon mode: keep a single Blender session (and its scene) warm and render
+    the jobs submitted to a spool directory, see render_queue.py."""
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    render_queue.init_spool(args.daemon_spool)
+    stats = render_queue.WorkerStats(worker)
+    scene_cache = make_scene_cache(args)
+    latents_cache = {}
+    plans_cache = {}
+    # jobs rendered but not finished yet, as their samples are in an open shard
+    unfinished = []
+
+    def renew_leases(claimed_paths=()):
+        for claimed_path in [*claimed_paths, *(path for path, _ in unfinished)]:
+            render_queue.renew_lease(claimed_path)
+
+    def finish_written_jobs():
+        for claimed_path, job in list(unfinished):
+            if job_written(job, args):
+                render_queue.finish_job(args.daemon_spool, claimed_path)
+                unfinished.remove((claimed_path, job))
+
+    print(f"Worker {worker} polling {args.daemon_spool}")
+
+    try:
+        while True:
+            claimed = render_queue.claim_job(args.daemon_spool, worker)
+            if claimed is None:
+                if args.exit_when_empty:
+                    break
+                time.sleep(args.poll_interval)
+                renew_leases()
+                stats.idle(args.poll_interval)
+                continue
+
+            claimed_path, job = claimed
+            start = time.perf_counter()
+            if job["latents"] not in latents_cache:
+                latents_cache[job["latents"]] = np.load(job["latents"], mmap_mode="r")
+                plans_cache[job["latents"]] = render_plan.load_or_build(job["latents"])
+            latents = latents_cache[job["latents"]]
+            material_names = resolve_material_names(
+                job.get("material_names"), count_objects(latents)
+            )
+            n_rendered = render_indices(
+                [View(latents, plans_cache[job["latents"]], material_names, job["output_folder"])],
+                np.arange(job["start"], job["stop"]),
+                args,
+                scene_cache,
+                writer=worker,
+                heartbeat=lambda: renew_leases([claimed_path]),
+            )
+            unfinished.append((claimed_path, job))
+            finish_written_jobs()
+            stats.job_done(n_rendered, time.perf_counter() - start)
+            stats.save(args.daemon_spool)
+    finally:
+        # the last shard of the worker is only complete now, also on SIGTERM
+        for shards in shard_outputs.values():
+            shards.close()
+        finish_written_jobs()
+
+    stats.save(args.daemon_spool)
+    print(f"Worker {worker} done: {stats.as_dict()}")
+
+
+def job_written(job, args):
+    """Whether all samples of a job are in their output. The samples of a
+    daemon worker writing shards are only recorded once their shard is closed,
+    a job whose samples are in the open shard is rendered again if the worker dies."""
+    if args.output_format != "shards":
+        return True
+    shards = shard_outputs.get(shard_folder([job["output_folder"]]))
+    return shards is None or all(idx in shards.journal for idx in range(job["start"], job["stop"]))
+
+
+# latents, render plan (see render_plan.py), one material name per object and
+# output folder of a view
+View = collections.namedtuple("View", ["latents", "plan", "material_names", "output_folder"])
+
+
+def load_views(args):
+    """Latents, render plan and materials of every view of --output-folder."""
+    # loading generative factors, one set of latents per view
+    if args.view_folders:
+        view_folders = [os.path.join(args.output_folder, f) for f in args.view_folders]
+    else:
+        view_folders = [args.output_folder]
+    view_materials = args.view_materials or [None] * len(view_folders)
+    if len(view_materials) != len(view_folders):
+        raise ValueError("--view-materials needs one material per view folder")
+
+    views = []
+    for folder, material in zip(view_folders, view_materials):
+        latents = load_latents(folder)
+        n_object = count_objects(latents)
+        material_names = resolve_material_names(
+            [material] if material is not None else args.material_names, n_object
+        )
+        views.append(View(latents, render_plan.load_or_build(folder), material_names, folder))
+    n_samples = views[0].latents.shape[0]
+    if any(view.latents.shape[0] != n_samples for view in views):
+        raise ValueError("All views need the same number of samples")
+    return views
+
+
+def load_latents(folder):
+    latents_path = os.path.join(folder, "latents.npy")
+    if not os.path.exists(latents_path):
+        raise ValueError("Latents could not be found; run latent generation first")
+    return np.load(latents_path)
+
+
+def count_objects(latents):
+    return (latents.shape[1] - N_SCENE_LATENTS) // N_OBJECT_LATENTS
+
+
+def resolve_material_names(material_names, n_object):
+    """Return one material name per object."""
+    if material_names is None:
+        return ["Rubber"] * n_object
+    elif len(material_names) == 1 and material_names[0] in ["Rubber","Crystal","Metallic"]:
+        return list(material_names) * n_object
+    elif len(material_names) == n_object:
+        return list(material_names)
+    else: raise ValueError(
+        f"Material names should be one of Rubber, Metallic or Crystal, or one per object ({n_object}), got {material_names}"
+    )
+
+
+def render_indices(views, indices, args, scene_cache, writer="main", heartbeat=None):
+    """Render the given samples of every view that are not recorded as done in
+    the output of the view yet, see open_output. All views of a sample are rendered
+    one after the other, so that only the materials and the latent-driven
+    properties change between them. heartbeat is called after every sample.
+    Returns the number of rendered images."""
+    n_object = count_objects(views[0].latents)
+    if args.frames_per_render > 1 and args.output_format == "memmap":
+        raise ValueError("--frames-per-render needs png files or shards, the viewer only holds the last frame")
+    if args.frames_per_render > 1 and image_writer is not None:
+        raise ValueError("--frames-per-render writes the frames with Blender, it cannot be used with --async-write")
+
+    # skipping samples already rendered by a previous run
+    outputs = open_outputs(views, args, writer)
+    timer.reset()
+    indices = np.asarray(
+        [idx for idx in indices if any(idx not in output for output in outputs)],
+        dtype=int,
+    )
+    print(f"{len(indices)} samples left to render")
+    if args.render_order == "shape":
+        indices = group_indices_by_shape(views[0].latents, indices, n_object)
 
     # image creation
-    for _, idx in enumerate(indices):
-
-        shapes=[SHAPE_DICT[k] for k in idx[-n_object:]]
-        
-        # creating default scene
-        initialize_renderer(
-            shapes,
-            args.material_names,
-            not args.no_spotlights,
-            render_tile_size=256 if args.use_gpu else 64,
-            use_gpu=args.use_gpu,
+    n_rendered = 0
+    rebuilds = scene_cache.rebuilds
+    material_swaps = scene_cache.material_swaps
+    updates = scene_cache.updates
+    skipped_updates = scene_cache.skipped_updates
+    # samples rendered together as frames of one animation, within runs of
+    # samples with the same shapes
+    step = args.frames_per_render
+    chunks = []
+    for _, run in itertools.groupby(
+        indices, key=lambda idx: object_shapes(np.asarray(views[0].latents[idx]), n_object)
+    ):
+        run = list(run)
+        chunks.extend(run[start:start + step] for start in range(0, len(run), step))
+
+    try:
+        for chunk in chunks:
+            for view, output in zip(views, outputs):
+                todo = [idx for idx in chunk if idx not in output]
+                # the samples rendered together share the shapes of their objects
+                for shapes, group in itertools.groupby(
+                    todo, key=lambda idx: object_shapes(np.asarray(view.latents[idx]), n_object)
+                ):
+                    group = list(group)
+                    if render_cache is not None:
+                        group = [idx for idx in group if not fetch_cached(view, output, idx, shapes, args, scene_cache)]
+                        if not group:
+                            continue
+
+                    # creating default scene, or reusing the one of the previous sample
+                    scene_cache.ensure(shapes, view.material_names, not args.no_spotlights)
+                    if step == 1:
+                        render_image(view, output, group[0], args, scene_cache)
+                    else:
+                        render_frames(view, output, group, args, scene_cache)
+                    n_rendered += len(group)
+            if image_writer is not None:
+                image_writer.poll()
+            if heartbeat is not None:
+                heartbeat()
+    finally:
+        # also reached on SIGTERM, the images still queued are written and recorded
+        if image_writer is not None:
+            with timer.stage("write"):
+                image_writer.flush()
+        for output in outputs:
+            output.close()
+    print(
+        f"Rendered {n_rendered} images with {scene_cache.rebuilds - rebuilds} scene rebuilds"
+        f" and {scene_cache.material_swaps - material_swaps} material swaps"
+    )
+    if render_cache is not None:
+        print(
+            f"Render cache: {render_cache.hits} hits, {render_cache.misses} misses"
+            f" ({100 * render_cache.hit_rate():.1f}% hit rate)"
         )
-        output_filename = os.path.join(
-            output_image_folder,
-            f"{str(idx).zfill(6)}.png",
+    if scene_cache.templates is not None:
+        print(
+            f"Opened {scene_cache.templates.hits} scene templates,"
+            f" built {scene_cache.templates.misses} new ones"
         )
-        if os.path.exists(output_filename):
-            print("Skipped file", output_filename)
+    updates = scene_cache.updates - updates
+    skipped_updates = scene_cache.skipped_updates - skipped_updates
+    print(
+        f"Skipped {skipped_updates} of {updates} scene property updates"
+        f" ({100 * skipped_updates / max(updates, 1):.1f}%) that did not change"
+    )
+    timer.print_summary()
+    return n_rendered
+
+
+# checksums of the files scenes are built from, computed once per process
+ASSET_CHECKSUMS = {}
+
+
+def asset_checksums(shape_names):
+    """sha1 of the base scene, materials and shapes a scene is built from and
+    of the code building it, by path relative to the repository."""
+    data = os.path.join(base_path, "data")
+    paths = [
+        os.path.join(data, "scenes", "base_scene_equal_xyz.blend"),
+        os.path.abspath(__file__),
+        render_utils.__file__,
+    ]
+    paths += sorted(glob.glob(os.path.join(data, "materials", "*.blend")))
+    paths += [os.path.join(data, "shapes", f"Shape{name}.blend") for name in sorted(set(shape_names))]
+    for path in paths:
+        if path not in ASSET_CHECKSUMS:
+            ASSET_CHECKSUMS[path] = render_io.file_checksum(path)
+    return {os.path.relpath(path, base_path): ASSET_CHECKSUMS[path] for path in paths}
+
+
+def scene_settings(renderer_kwargs):
+    """Renderer settings of a scene cache as they are saved with a template."""
+    settings = dict(renderer_kwargs)
+    # the passes are written to a new folder by every process
+    settings["passes_dir"] = settings["passes_dir"] is not None
+    return settings
+
+
+def render_key(plan, shape_names, material_names, include_lights, renderer_kwargs):
+    """Hash of everything that determines the image of a render plan row: its
+    values rounded to the float32 precision Blender stores them with, the
+    shapes, materials, lights, renderer settings and assets. The number of
+    threads, the tile size and whether the pixels are read back from Blender
+    do not change the image, so runs writing PNG files and arrays share
+    their cache entries."""
+    values = [np.round(np.asarray(plan[field], dtype=np.float64).ravel(), 6) for field in RENDER_KEY_FIELDS]
+    settings = scene_settings(renderer_kwargs)
+    del settings["threads"], settings["render_tile_size"], settings["capture_pixels"]
+    config = {
+        "shape_names": list(shape_names),
+        "material_names": list(material_names),
+        "include_lights": bool(include_lights),
+        "settings": settings,
+        "assets": asset_checksums(shape_names),
+    }
+    digest = hashlib.sha1(np.concatenate(values).tobytes())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cached_passes(output_filename, args):
+    """The files of a sample that are cached with its image, besides the image."""
+    if not args.passes:
+        return {}
+    return {"_passes.npz": render_io.passes_path(output_filename)}
+
+
+def fetch_cached(view, output, idx, shapes, args, scene_cache):
+    """Hand a sample whose image is in the render cache to the output of the
+    view. Returns False if it has to be rendered."""
+    key = render_key(view.plan[idx], shapes, view.material_names, not args.no_spotlights, scene_cache.renderer_kwargs)
+    with timer.stage("render_cache"):
+        output_filename = output.image_path(idx)
+        if args.output_format == "memmap":
+            pixels = render_cache.fetch_array(key, cached_passes(output_filename, args))
+            if pixels is None:
+                return False
+            output.write(idx, pixels)
+        else:
+            files = {os.path.splitext(output_filename)[1]: output_filename, **cached_passes(output_filename, args)}
+            if not render_cache.fetch(key, files):
+                return False
+            output.record(idx, output_filename, 0.0)
+    timer.sample_done(idx, view=os.path.basename(str(view.output_folder)), cached=True)
+    return True
+
+
+def store_cached(view, output_filename, idx, shapes, args, scene_cache, pixels=None):
+    """Add a rendered image (or its pixels for memmap outputs) to the render cache."""
+    key = render_key(view.plan[idx], shapes, view.material_names, not args.no_spotlights, scene_cache.renderer_kwargs)
+    if pixels is not None:
+        render_cache.store_array(key, pixels, cached_passes(output_filename, args))
+        return
+    files = {os.path.splitext(output_filename)[1]: output_filename, **cached_passes(output_filename, args)}
+    render_cache.store(key, files)
+
+
+def render_image(view, output, idx, args, scene_cache):
+    """Render one sample of a view and hand it to the output of the view."""
+    output_filename = output.image_path(idx)
+    print('getting into rendering')
+    start = time.perf_counter()
+    render_sample(
+        view.plan[idx],
+        scene_cache,
+        not args.no_spotlights,
+        output_filename,
+        args.save_scene,
+        write_image=args.output_format != "memmap" and image_writer is None,
+    )
+    with timer.stage("write"):
+        if args.passes:
+            save_passes(output_filename, scene_cache.renderer_kwargs["passes_dir"])
+        if args.output_format == "memmap":
+            pixels = render_io.linear_to_srgb(render_utils.read_viewer_pixels())
+            if render_cache is not None:
+                store_cached(view, output_filename, idx, scene_cache.key[0], args, scene_cache, pixels)
+            output.write(idx, pixels)
+        elif image_writer is not None:
+            # encoded and written in the background, recorded once in place
+            pixels = render_io.linear_to_srgb(render_utils.read_viewer_pixels())
+            seconds = time.perf_counter() - start
+            shapes = scene_cache.key[0]
+
+            def written():
+                if render_cache is not None:
+                    store_cached(view, output_filename, idx, shapes, args, scene_cache)
+                output.record(idx, output_filename, seconds)
+
+            image_writer.submit(output_filename, pixels, written)
+        else:
+            if render_cache is not None:
+                store_cached(view, output_filename, idx, scene_cache.key[0], args, scene_cache)
+            output.record(idx, output_filename, time.perf_counter() - start)
+    timer.sample_done(idx, view=os.path.basename(str(view.output_folder)))
+    print('done with rendering')
+
+
+def render_frames(view, output, indices, args, scene_cache):
+    """Render several samples of a view as the frames of one animation, so that
+    the scene export, kernel setup and denoiser initialisation of a render are
+    shared by all of them. The parameters of the i-th sample are keyframed on
+    frame i + 1 and the frames are renamed to the images of the samples."""
+    scene = bpy.context.scene
+    frames_dir = os.path.join(os.path.dirname(output.image_path(indices[0])), f".frames.{os.getpid()}")
+    os.makedirs(frames_dir, exist_ok=True)
+    print(f"getting into rendering {len(indices)} frames")
+    start = time.perf_counter()
+
+    with timer.stage("update_objects_and_lights"):
+        # keyframes hold their value until the next one, so that properties
+        # only need a keyframe on the frames where they change
+        bpy.context.preferences.edit.keyframe_new_interpolation_type = "CONSTANT"
+        clear_animation(scene_cache)
+        for frame, idx in enumerate(indices, start=1):
+            update_objects_and_lights(view.plan[idx], scene_cache, not args.no_spotlights, frame=frame)
+
+    scene.frame_start = 1
+    scene.frame_end = len(indices)
+    scene.render.use_persistent_data = True
+    scene.render.filepath = os.path.join(frames_dir, "frame_####")
+    with timer.stage("render"):
+        bpy.ops.render.render(animation=True)
+    seconds = (time.perf_counter() - start) / len(indices)
+
+    with timer.stage("write"):
+        for frame, idx in enumerate(indices, start=1):
+            output_filename = output.image_path(idx)
+            if args.passes:
+                save_passes(output_filename, scene_cache.renderer_kwargs["passes_dir"], frame)
+            os.makedirs(os.path.dirname(output_filename), exist_ok=True)
+            os.replace(os.path.join(frames_dir, f"frame_{frame:04d}.png"), output_filename)
+            if render_cache is not None:
+                store_cached(view, output_filename, idx, scene_cache.key[0], args, scene_cache)
+            output.record(idx, output_filename, seconds)
+    os.rmdir(frames_dir)
+    timer.sample_done(indices[0], view=os.path.basename(str(view.output_folder)), frames=len(indices))
+    print('done with rendering')
+
+
+def clear_animation(scene):
+    """Remove the keyframes of a previous render_frames call. The last values
+    written to the scene are not known anymore, so all properties are keyframed
+    on the first frame."""
+    for obj in scene.objects + scene.lights + [scene.ground]:
+        obj.animation_data_clear()
+        if obj.type == "LIGHT":
+            obj.data.animation_data_clear()
+        else:
+            obj.material_slots[-1].material.node_tree.animation_data_clear()
+    scene.applied = {}
+
+
+def save_passes(output_filename, passes_dir, frame=None):
+    """Save the object index mask, depth and normals of the last render (or of
+    a frame of the last animation) next to its image, see render_utils.read_passes."""
+    if frame is None:
+        frame = bpy.context.scene.frame_current
+    passes = render_utils.read_passes(passes_dir, frame)
+    filename = render_io.passes_path(output_filename)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    np.savez_compressed(render_io.partial_path(filename), **passes)
+    os.replace(render_io.partial_path(filename), filename)
+
+
+# shard outputs kept open for the life of a daemon worker, by folder
+shard_outputs = {}
+
+
+def open_outputs(views, args, writer="main"):
+    """Return, for every view, the record of the samples that were already
+    rendered and of where their images go: the completion journal of the PNG
+    files, the array store the pixels are written to, or the tar shards shared
+    by all views."""
+    if args.output_format == "shards":
+        folder = shard_folder([view.output_folder for view in views])
+        shards = shard_outputs.get(folder)
+        if shards is None:
+            # a daemon worker keeps filling its shard across jobs, see serve
+            keep_open = args.daemon_spool is not None
+            shards = render_io.ShardOutput(folder, writer, args.shard_size, ext=image_ext(args), keep_open=keep_open)
+            if keep_open:
+                shard_outputs[folder] = shards
+        outputs = []
+        for view in views:
+            raw_latents_path = os.path.join(view.output_folder, "raw_latents.npy")
+            raw_latents = None
+            if os.path.exists(raw_latents_path):
+                raw_latents = np.load(raw_latents_path, mmap_mode="r")
+            outputs.append(
+                shards.view(os.path.basename(str(view.output_folder)), view.latents, raw_latents)
+            )
+        return outputs
+
+    outputs = []
+    for view in views:
+        folder = os.path.join(view.output_folder, "images")
+        if args.output_format == "memmap":
+            outputs.append(
+                render_io.ArrayStore(folder, view.latents.shape[0], args.image_size, args.image_size)
+            )
+        else:
+            outputs.append(
+                render_io.RenderJournal(folder, writer=writer, ext=image_ext(args), fanout=args.fanout)
+            )
+    return outputs
+
+
+def shard_folder(output_folders):
+    """Folder of the tar shards shared by the views in output_folders."""
+    return os.path.join(os.path.commonpath([str(folder) for folder in output_folders]), "shards")
+
+
+def image_ext(args):
+    """Extension of the image files, Blender itself only writes PNG files."""
+    return render_io.IMAGE_FORMATS[args.image_format][0]
+
+
+def make_scene_cache(args, quality=None, capture_pixels=None):
+    if quality is None:
+        quality = args.quality
+    if capture_pixels is None:
+        capture_pixels = args.output_format == "memmap" or image_writer is not None
+    return SceneCache(
+        templates=TemplateStore(args.template_dir) if args.template_dir else None,
+        width=args.image_size,
+        height=args.image_size,
+        render_tile_size=args.tile_size or (256 if args.use_gpu else 64),
+        threads=args.threads,
+        use_gpu=args.use_gpu,
+        capture_pixels=capture_pixels,
+        passes_dir=tempfile.mkdtemp(prefix="passes_") if args.passes else None,
+        **QUALITY_PROFILES[quality],
+    )
+
+
+def prewarm_templates(args):
+    """Build the scene template of every configuration found in the latents of
+    the views, so that workers never have to initialize a scene."""
+    if args.template_dir is None:
+        raise ValueError("--prewarm-templates needs a --template-dir")
+    args.output_folder = pathlib.Path(args.output_folder).absolute()
+    scene_cache = make_scene_cache(args)
+    configurations = set()
+    for view in load_views(args):
+        n_object = count_objects(view.latents)
+        for object_types in np.unique(np.asarray(view.latents[:, -n_object:]), axis=0):
+            configurations.add((object_shapes(object_types, n_object), tuple(view.material_names)))
+
+    n_built = 0
+    for shape_names, material_names in sorted(configurations):
+        path = scene_cache.templates.path(shape_names, material_names, not args.no_spotlights, scene_cache.renderer_kwargs)
+        if os.path.exists(path):
             continue
+        print("Building template", shape_names, material_names)
+        scene_cache.build(shape_names, material_names, not args.no_spotlights)
+        n_built += 1
+    print(f"Built {n_built} of {len(configurations)} scene templates in {args.template_dir}")
 
-        current_latents = latents[idx]
 
-        print('getting into rendering')
-        render_sample(
-            current_latents,
-            args.material_names,
-            not args.no_spotlights,
-            output_filename,
-            args.save_scene,
+def benchmark_quality(args):
+    """Render the first --benchmark-quality samples under every quality profile
+    and compare the speed and the PSNR/SSIM gap to the production images."""
+    args.output_folder = pathlib.Path(args.output_folder).absolute()
+    latents = load_latents(args.output_folder)
+    n_object = count_objects(latents)
+    material_names = resolve_material_names(args.material_names, n_object)
+    indices = np.arange(min(args.benchmark_quality, latents.shape[0]))
+    plan = render_plan.build_plan(latents[indices])
+
+    # the reference is rendered first
+    profiles = ["production"] + [q for q in QUALITY_PROFILES if q != "production"]
+    images = {}
+    results = {}
+    for quality in profiles:
+        scene_cache = make_scene_cache(args, quality=quality, capture_pixels=True)
+        images[quality] = []
+        seconds = 0.0
+        for idx in indices:
+            current_latents = np.asarray(latents[idx])
+            scene_cache.ensure(object_shapes(current_latents, n_object), material_names, not args.no_spotlights)
+            start = time.perf_counter()
+            render_sample(
+                plan[idx],
+                scene_cache,
+                not args.no_spotlights,
+                f"{quality}_{idx:06d}.png",
+                False,
+                write_image=False,
+            )
+            seconds += time.perf_counter() - start
+            images[quality].append(render_io.linear_to_srgb(render_utils.read_viewer_pixels()))
+        results[quality] = {
+            "seconds_per_image": seconds / len(indices),
+            "psnr": float(np.mean([render_stats.psnr(a, b) for a, b in zip(images[quality], images["production"])])),
+            "ssim": float(np.mean([render_stats.ssim(a, b) for a, b in zip(images[quality], images["production"])])),
+        }
+
+    print(f"{'profile':<12}{'s/image':>10}{'PSNR [dB]':>12}{'SSIM':>8}")
+    for quality, r in results.items():
+        print(f"{quality:<12}{r['seconds_per_image']:>10.3f}{r['psnr']:>12.2f}{r['ssim']:>8.4f}")
+    with open(os.path.join(args.output_folder, "quality_benchmark.json"), "w") as f:
+        json.dump({"n_images": len(indices), "profiles": QUALITY_PROFILES, "results": results}, f, indent=1)
+    return results
+
+
+def benchmark_frames(args):
+    """Render the first --benchmark-samples samples with every number of frames
+    per render given to --benchmark-frames and compare the throughput."""
+    args.output_folder = pathlib.Path(args.output_folder).absolute()
+    latents = load_latents(args.output_folder)
+    n_object = count_objects(latents)
+    material_names = resolve_material_names(args.material_names, n_object)
+    indices = np.arange(min(args.benchmark_samples, latents.shape[0]))
+    plan = render_plan.build_plan(latents[indices])
+    args.output_format = "png"
+
+    results = {}
+    for frames in args.benchmark_frames:
+        args.frames_per_render = frames
+        folder = tempfile.mkdtemp(prefix=f"frames_{frames}_", dir=args.output_folder)
+        start = time.perf_counter()
+        render_indices([View(latents, plan, material_names, folder)], indices, args, make_scene_cache(args))
+        seconds = time.perf_counter() - start
+        shutil.rmtree(folder)
+        results[frames] = {
+            "seconds_per_image": seconds / len(indices),
+            "images_per_hour": 3600 * len(indices) / seconds,
+        }
+
+    print(f"{'frames/render':<16}{'s/image':>10}{'images/hour':>14}{'speedup':>10}")
+    for frames, r in results.items():
+        speedup = r["images_per_hour"] / results[args.benchmark_frames[0]]["images_per_hour"]
+        print(f"{frames:<16}{r['seconds_per_image']:>10.3f}{r['images_per_hour']:>14.0f}{speedup:>9.2f}x")
+    with open(os.path.join(args.output_folder, "frames_benchmark.json"), "w") as f:
+        json.dump({"n_images": len(indices), "use_gpu": args.use_gpu, "quality": args.quality, "results": results}, f, indent=1)
+    return results
+
+
+def object_shapes(latents, n_objects):
+    """Return the shape names of the objects encoded in a latent row."""
+    return tuple(SHAPE_DICT[int(k)] for k in latents[-n_objects:])
+
+
+def group_indices_by_shape(latents, indices, n_objects):
+    """Reorder indices so that samples with the same object types are rendered
+    back to back; the order within a group stays the index order."""
+    object_types = latents[indices, -n_objects:].astype(int)
+    order = np.lexsort(object_types.T[::-1])
+    return indices[order]
+
+
+class SceneCache:
+    """Keeps the initialized scene alive between samples.
+
+    The scene only depends on the object shapes and whether spotlights are
+    added, so it is only rebuilt when these change. Changing the materials of
+    the objects only swaps their node groups.
+
+    The values last written to every scene property are kept as well, so that
+    properties that did not change since the previous sample (e.g. content
+    factors shared between views, constant factors) are not written again and
+    Cycles does not re-sync the corresponding geometry or shaders.
+    """
+
+    def __init__(self, templates=None, **renderer_kwargs):
+        self.renderer_kwargs = renderer_kwargs
+        self.templates = templates
+        self.key = None
+        self.objects = []
+        self.lights = []
+        self.ground = None
+        self.max_object_size = 0.0
+        self.material_names = None
+        self.rebuilds = 0
+        self.material_swaps = 0
+        self.applied = {}
+        self.updates = 0
+        self.skipped_updates = 0
+
+    def ensure(self, shape_names, material_names, include_lights=True):
+        """Build the scene for the given configuration unless it is already loaded.
+        Returns True if the scene was rebuilt."""
+        key = (tuple(shape_names), bool(include_lights))
+        if key == self.key:
+            if tuple(material_names) != self.material_names:
+                with timer.stage("swap_materials"):
+                    swap_materials(material_names)
+                self.material_names = tuple(material_names)
+                # the colors are set on the new node groups again
+                self.applied = {k: v for k, v in self.applied.items() if k[0] != "color"}
+                self.material_swaps += 1
+            return False
+        self.build(shape_names, material_names, include_lights)
+        self.key = key
+        self.material_names = tuple(material_names)
+        self.rebuilds += 1
+        self.applied = {}
+
+        # objects updated for every sample, looked up once per scene
+        self.objects = [bpy.data.objects[find_object_name(i)] for i in range(len(shape_names))]
+        self.lights = []
+        if include_lights:
+            self.lights = [bpy.data.objects[f"Spotlight_Object_{i}"] for i in range(len(shape_names))]
+        self.ground = bpy.data.objects["Ground"]
+        self.max_object_size = max(max(obj.dimensions) for obj in self.objects)
+        return True
+
+    def build(self, shape_names, material_names, include_lights):
+        """Open the saved template of a configuration, or initialize the scene
+        and save it as template if a template store is used."""
+        path = None
+        if self.templates is not None:
+            path = self.templates.path(shape_names, material_names, include_lights, self.renderer_kwargs)
+            with timer.stage("open_template"):
+                opened = self.templates.open(path)
+                if opened:
+                    setup_device(self.renderer_kwargs["use_gpu"], self.renderer_kwargs["render_num_samples"])
+                    if self.renderer_kwargs["passes_dir"] is not None:
+                        render_utils.set_passes_dir(self.renderer_kwargs["passes_dir"])
+            if opened:
+                return
+        with timer.stage("initialize_renderer"):
+            initialize_renderer(
+                list(shape_names),
+                list(material_names),
+                include_lights,
+                **self.renderer_kwargs,
+            )
+        if path is not None:
+            self.templates.save(path)
+
+    def changed(self, prop, value):
+        """Return whether value differs from the value last written to the scene
+        property prop, a (name, object index) tuple, and remember it if it does."""
+        self.updates += 1
+        last = self.applied.get(prop)
+        if last is not None and np.allclose(last, value, rtol=0.0, atol=UPDATE_TOLERANCE):
+            self.skipped_updates += 1
+            return False
+        self.applied[prop] = np.array(value)
+        return True
+
+
+class TemplateStore:
+    """Initialized scenes saved as .blend files, one per configuration.
+
+    A configuration is given by the object shapes, their materials, whether
+    spotlights are added and the renderer settings. Its file name is a hash of
+    the configuration and of the content of every file the scene is built
+    from (base scene, materials, shapes and the code building the scene), so
+    templates are rebuilt whenever one of them changes. Opening a template
+    replaces loading all assets and initializing the scene.
+    """
+
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self.configs = {}
+
+    def path(self, shape_names, material_names, include_lights, renderer_kwargs):
+        config = {
+            "shape_names": list(shape_names),
+            "material_names": list(material_names),
+            "include_lights": bool(include_lights),
+            "settings": scene_settings(renderer_kwargs),
+            "assets": asset_checksums(shape_names),
+        }
+        digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+        path = os.path.join(self.folder, f"{digest}.blend")
+        self.configs[path] = config
+        return path
+
+    def open(self, path):
+        """Open a template, returns False if it was not built yet."""
+        if not os.path.exists(path):
+            self.misses += 1
+            return False
+        bpy.ops.wm.open_mainfile(filepath=path)
+        self.hits += 1
+        return True
+
+    def save(self, path):
+        """Save the current scene as template, without changing the file it
+        belongs to. The configuration is saved next to it for inspection."""
+        root = os.path.splitext(path)[0]
+        tmp = render_io.partial_path(f"{root}.{os.getpid()}.blend")
+        with open(f"{tmp}.json", "w") as f:
+            json.dump(self.configs[path], f, indent=1)
+        os.replace(f"{tmp}.json", f"{root}.json")
+        bpy.ops.wm.save_as_mainfile(filepath=tmp, copy=True)
+        os.replace(tmp, path)
+
+
+def swap_materials(material_names):
+    """Change the material of every object of the current scene."""
+    for i, material_name in enumerate(material_names):
+        object_name = find_object_name(i)
+        render_utils.swap_material(
+            bpy.data.objects[object_name].material_slots[-1].material, material_name
         )
-        print('done with rendering')
+
+
+def find_object_name(i):
+    """Name of the i-th object added by add_objects_and_lights."""
+    for obj in bpy.data.objects:
+        if obj.name.endswith(f"Object_{i}"):
+            return obj.name
+    raise KeyError(f"Object_{i} is not in the scene")
+
+
+def setup_device(use_gpu, render_num_samples):
+    """Select the Cycles device. The compute device preferences are not saved
+    in .blend files, so this is also needed after opening a scene template."""
+    if use_gpu == 1:
+        # Blender changed the API for enabling CUDA at some point
+        if bpy.app.version < (2, 78, 0):
+            bpy.context.user_preferences.system.compute_device_type = "CUDA"
+            bpy.context.user_preferences.system.compute_device = "CUDA_0"
+        else:
+            # Mark all scene devices as GPU for cycles
+            bpy.context.scene.cycles.device = "GPU"
+
+            for scene in bpy.data.scenes:
+                scene.cycles.device = "GPU"
+                scene.render.resolution_percentage = 100
+                scene.cycles.samples = render_num_samples
+
+            # Enable CUDA
+            bpy.context.preferences.addons[
+                "cycles"
+            ].preferences.compute_device_type = "CUDA"
+
+            # Enable and list all devices, or optionally disable CPU
+            for devices in bpy.context.preferences.addons[
+                "cycles"
+            ].preferences.get_devices():
+                for d in devices:
+                    d.use = True
+                    if d.type == "CPU":
+                        d.use = False
 
 
 def initialize_renderer(
@@ -105,11 +952,17 @@ def initialize_renderer(
     width=224,
     height=224,
     render_tile_size=64,
+    threads=0,
     use_gpu=False,
     render_num_samples=512,
     render_min_bounces=8,
     render_max_bounces=8,
+    adaptive_threshold=0.0,
+    use_denoising=True,
+    denoiser=None,
     ground_texture=None,
+    capture_pixels=False,
+    passes_dir=None,
 ):
     """Initialize renderer and base scene"""
 
@@ -123,18 +976,6 @@ def initialize_renderer(
     material_dir = os.path.join(base_path, "data", "materials")
     render_utils.load_materials(material_dir)
 
-    # Load segmentation node group
-    # node_path = 'data/node_groups/NodeGroupMulti4.blend'
-    segm_node_path = os.path.join(base_path, "data/node_groups/NodeGroup.blend")
-    with bpy.data.libraries.load(segm_node_path) as (data_from, data_to):
-        data_to.objects = data_from.objects
-        data_to.materials = data_from.materials
-        data_to.node_groups = data_from.node_groups
-    segm_node_mat = data_to.materials[0]
-    segm_node_group_elems = (
-        data_to.node_groups[0].nodes["ColorRamp"].color_ramp.elements
-    )
-
     # Set render arguments so we can get pixel coordinates later.
     # We use functionality specific to the CYCLES renderer so BLENDER_RENDER
     # cannot be used.
@@ -145,33 +986,11 @@ def initialize_renderer(
     render_args.resolution_percentage = 100
     render_args.tile_x = render_tile_size
     render_args.tile_y = render_tile_size
-    if use_gpu == 1:
-        # Blender changed the API for enabling CUDA at some point
-        if bpy.app.version < (2, 78, 0):
-            bpy.context.user_preferences.system.compute_device_type = "CUDA"
-            bpy.context.user_preferences.system.compute_device = "CUDA_0"
-        else:
-            # Mark all scene devices as GPU for cycles
-            bpy.context.scene.cycles.device = "GPU"
-
-            for scene in bpy.data.scenes:
-                scene.cycles.device = "GPU"
-                scene.render.resolution_percentage = 100
-                scene.cycles.samples = render_num_samples
-
-            # Enable CUDA
-            bpy.context.preferences.addons[
-                "cycles"
-            ].preferences.compute_device_type = "CUDA"
-
-            # Enable and list all devices, or optionally disable CPU
-            for devices in bpy.context.preferences.addons[
-                "cycles"
-            ].preferences.get_devices():
-                for d in devices:
-                    d.use = True
-                    if d.type == "CPU":
-                        d.use = False
+    # 0 lets Cycles use all cores, several workers on a node get a share each
+    render_args.threads_mode = "FIXED" if threads > 0 else "AUTO"
+    if threads > 0:
+        render_args.threads = threads
+    setup_device(use_gpu, render_num_samples)
 
     # Some CYCLES-specific stuff
     bpy.data.worlds["World"].cycles.sample_as_light = True
@@ -179,18 +998,36 @@ def initialize_renderer(
     bpy.context.scene.cycles.samples = render_num_samples
     bpy.context.scene.cycles.transparent_min_bounces = render_min_bounces
     bpy.context.scene.cycles.transparent_max_bounces = render_max_bounces
+    # adaptive sampling stops sampling pixels whose noise is below the threshold
+    bpy.context.scene.cycles.use_adaptive_sampling = adaptive_threshold > 0
+    if adaptive_threshold > 0:
+        bpy.context.scene.cycles.adaptive_threshold = adaptive_threshold
     if use_gpu == 1:
         bpy.context.scene.cycles.device = "GPU"
 
     # activate denoising to make spot lights look nicer
-    bpy.context.scene.view_layers["RenderLayer"].cycles.use_denoising = True
-    bpy.context.view_layer.cycles.use_denoising = True
+    bpy.context.scene.view_layers["RenderLayer"].cycles.use_denoising = use_denoising
+    bpy.context.view_layer.cycles.use_denoising = use_denoising
+    if use_denoising and denoiser is not None:
+        bpy.context.scene.cycles.denoiser = denoiser
 
     # disable reflections
     bpy.context.scene.cycles.max_bounces = 0
 
+    # make the rendered pixels readable from python
+    if capture_pixels:
+        render_utils.enable_viewer_output()
+
+    # object index, depth and normal passes of the same render
+    if passes_dir is not None:
+        render_utils.enable_passes(passes_dir)
+
     # Now add objects and spotlights
-    add_objects_and_lights(shape_names, material_names, include_lights, base_path)
+    with timer.stage("add_objects_and_lights"):
+        add_objects_and_lights(shape_names, material_names, include_lights, base_path)
+        # the dimensions of objects created without operators are only known
+        # once the view layer is evaluated
+        bpy.context.view_layer.update()
 
     max_object_height = max(
         [max(o.dimensions) for o in bpy.data.objects if "Object_" in o.name]
@@ -213,17 +1050,6 @@ def initialize_renderer(
         # bpy.data.objects["Ground"].data.materials.clear()
         render_utils.add_material("Rubber", Color=(0.5, 0.5, 0.5, 1.0))
 
-    # Segmentation materials and colors
-    n_objects = len(material_names)
-    segm_node_mat.node_tree.nodes["Group"].inputs[1].default_value = n_objects
-    segm_mat = []
-    segm_color = []
-    for i in range(n_objects + 1):
-        segm_node_mat.node_tree.nodes["Group"].inputs[0].default_value = i
-        segm_mat.append(segm_node_mat.copy())
-        segm_color.append(list(segm_node_group_elems[i].color))
-
-
 def add_objects_and_lights(shape_names, material_names, add_lights, base_path):
     shapes_path = os.path.join(base_path, "data", "shapes")
 
@@ -234,7 +1060,9 @@ def add_objects_and_lights(shape_names, material_names, add_lights, base_path):
             shapes_path, f"Shape{shape_name}", f"Object_{i}", 1.5, (0.0, 0.0, 0.0)
         )
 
-        bpy.data.objects[object_name].data.materials.clear()
+        # object index of the segmentation pass, 0 is the background
+        bpy.data.objects[object_name].pass_index = i + 1
+
         render_utils.add_material(
             material_name, bpy.data.objects[object_name], Color=(0.0, 0.0, 0.0, 1.0)
         )
@@ -272,86 +1100,65 @@ def add_objects_and_lights(shape_names, material_names, add_lights, base_path):
             dg.update()
 
 
-def update_objects_and_lights(latents, material_names, update_lights):
-    """Parse latents and update the object(s) position, rotation and color
-    as well as the spotlight's position and color."""
-    scene_latents = latents[[SPOT_HUE,SPOT_POS]]
-    objects_latents = latents[BKG_HUE+1:]
-
-    new_order=[]
-    for i in range(7):
-        new_order.append(list(np.arange(objects_latents.shape[-1])[i::len(material_names)]))
-    object_latents=np.array_split(object_latents[:,new_order],len(material_names))
-    max_object_size = max(
-        [max(o.dimensions) for o in bpy.data.objects if "Object_" in o.name]
-    )
-
-    for i, (object_latents, material_name) in enumerate(
-        zip(objects_latents, material_names)
-    ):
-        # find correct object name
-        object_name = None
-        for obj in bpy.data.objects:
-            if obj.name.endswith(f"Object_{i}"):
-                object_name = obj.name
-                break
-        assert object_name is not None
-
-        # update object location and rotation
-        object = bpy.data.objects[object_name]
-        object.location = (
-            object_latents[3],
-            object_latents[4],
-            object_latents[5] + max_object_size / 2,
-        )
-
-        object.rotation_euler = tuple(np.concatenate([object_latents[1:2],0.0],axis=-1))  # replace gamma angle
+def update_objects_and_lights(plan, scene, update_lights, frame=None):
+    """Copy a render plan row (see render_plan.py) into the scene: position,
+    rotation and color of the objects, position and color of the spotlights and
+    color of the ground. Only the properties that changed since the previous
+    sample are written, so that moving objects does not re-sync their shaders
+    and changing colors does not rebuild the BVH. If frame is given, the written
+    properties are also keyframed on that frame."""
+    # the objects stand on the ground, the spotlights are above the objects
+    object_offset = np.array([0.0, 0.0, scene.max_object_size / 2])
+    light_offset = np.array([0.0, 0.0, scene.max_object_size])
+
+    for i, obj in enumerate(scene.objects):
+        location = plan["location"][i] + object_offset
+        if scene.changed(("location", i), location):
+            set_property(obj, "location", location.tolist(), frame)
+        if scene.changed(("rotation", i), plan["rotation"][i]):
+            set_property(obj, "rotation_euler", plan["rotation"][i].tolist(), frame)
+        if scene.changed(("color", i), plan["color"][i]):
+            render_utils.change_material(
+                obj.material_slots[-1].material, frame=frame, Color=plan["color"][i].tolist()
+            )
 
-        # update object color
-        saturation=1.0
-        value=1.0
-        rgba_object = colorsys.hsv_to_rgb(
-            object_latents[0] / (2.0 * np.pi), saturation, value,
-        ) + (1.0,)
+    if update_lights:
+        light_location = plan["light_location"] + light_offset
+        for i, light in enumerate(scene.lights):
+            if scene.changed(("light_color", i), plan["light_color"]):
+                set_property(light.data, "color", plan["light_color"].tolist(), frame)
+            if scene.changed(("light_location", i), light_location):
+                set_property(light, "location", light_location.tolist(), frame)
 
+    if scene.changed(("background", 0), plan["background"]):
         render_utils.change_material(
-            bpy.data.objects[object_name].data.materials[-1], Color=rgba_object
+            scene.ground.material_slots[-1].material, frame=frame, Color=plan["background"].tolist()
         )
 
-        if update_lights:
-            # update light color
-            saturation=0.8
-            value=1.0
-            rgb_light = colorsys.hsv_to_rgb(scene_latents[0] / (2.0 * np.pi), saturation,value)
-            bpy.data.objects[f"Spotlight_Object_{i}"].data.color = rgb_light
-            # update light location
-            bpy.data.objects[f"Spotlight_Object_{i}"].location = (
-                4 * np.sin(scene_latents[1]),
-                4 * np.cos(scene_latents[1]),
-                6 + max_object_size,
-            )
-
 
-def render_sample(latents, material_names, include_lights, output_filename, save_scene):
-    """Update the scene based on the latents and render the scene and save as an image."""
+def set_property(owner, data_path, value, frame=None):
+    setattr(owner, data_path, value)
+    if frame is not None:
+        owner.keyframe_insert(data_path=data_path, frame=frame)
 
-    # background saturation and value
-    saturation = 0.6
-    value = 1.0
 
-    # set output path
-    bpy.context.scene.render.filepath = output_filename
+def render_sample(plan, scene, include_lights, output_filename, save_scene, write_image=True):
+    """Update the scene to a render plan row, render it and save the image.
+    With write_image=False the image is only rendered, e.g. to read its pixels back."""
 
-    # set objects and lights
-    update_objects_and_lights(latents, material_names, include_lights)
+    # set output path, the image is moved to its final path once fully written
+    bpy.context.scene.render.filepath = render_io.partial_path(output_filename)
 
-    rgba_background = colorsys.hsv_to_rgb(latents[BKG_HUE] / (2.0 * np.pi), saturation, value) + (1.0,) 
-    render_utils.change_material(
-        bpy.data.objects["Ground"].data.materials[-1], Color=rgba_background,
-    )
+    # set objects, lights and background
+    with timer.stage("update_objects_and_lights"):
+        update_objects_and_lights(plan, scene, include_lights)
 
     # set scene background
-    bpy.ops.render.render(write_still=True)
+    with timer.stage("render"):
+        bpy.ops.render.render(write_still=write_image)
+    if write_image:
+        with timer.stage("write"):
+            os.replace(render_io.partial_path(output_filename), output_filename)
 
     if save_scene:
         # just for debugging
@@ -361,28 +1168,8 @@ def render_sample(latents, material_names, include_lights, output_filename, save
 
 
 if __name__ == "__main__":
-    base_path = pathlib.Path(__file__).parent.absolute()
-
-    INSIDE_BLENDER = True
-    try:
-        import bpy, bpy_extras
-        from mathutils import Vector
-    except ImportError as e:
-        INSIDE_BLENDER = False
-    if INSIDE_BLENDER:
-        try:
-            import render_utils
-        except ImportError as e:
-            try:
-                print("Could not import render_utils.py; trying to hot patch it.")
-                site.addsitedir(base_path)
-                import render_utils
-            except ImportError as e:
-                print("\nERROR")
-                sys.exit(1)
-
     parser = argparse.ArgumentParser()
-    parser.add_argument("--output-folder", required=True,type=str)
+    parser.add_argument("--output-folder", type=str)
     parser.add_argument("--n-batches", default=100,type=int)
     parser.add_argument("--nlatents", default=9, type=int)
     parser.add_argument("--batch-index", default=0, type=int)
@@ -392,12 +1179,58 @@ if __name__ == "__main__":
     parser.add_argument("--shape-names", nargs="+", type=str)
     parser.add_argument("--save-scene", action="store_true")
     parser.add_argument("--no_range_change",action="store_true")
+    parser.add_argument("--render-order", default="index", choices=["index", "shape"])
+    parser.add_argument("--view-folders", nargs="+", type=str)
+    parser.add_argument("--view-materials", nargs="+", type=str)
+    parser.add_argument("--output-format", default="png", choices=["png", "memmap", "shards"])
+    parser.add_argument("--shard-size", default=1 << 30, type=int)
+    parser.add_argument("--fanout", default=None, type=int)
+    parser.add_argument("--image-size", default=224, type=int)
+    parser.add_argument("--threads", default=0, type=int)
+    parser.add_argument("--tile-size", default=None, type=int)
+    parser.add_argument("--quality", default="production", choices=list(QUALITY_PROFILES))
+    parser.add_argument("--benchmark-quality", type=int, default=None)
+    parser.add_argument("--passes", action="store_true")
+    parser.add_argument("--frames-per-render", type=int, default=1)
+    parser.add_argument("--benchmark-frames", nargs="+", type=int, default=None)
+    parser.add_argument("--benchmark-samples", type=int, default=64)
+    parser.add_argument("--template-dir", type=str, default=None)
+    parser.add_argument("--render-cache", type=str, default=None)
+    parser.add_argument("--async-write", type=int, default=0)
+    parser.add_argument("--write-queue", type=int, default=16)
+    parser.add_argument("--image-format", default="png", choices=list(render_io.IMAGE_FORMATS))
+    parser.add_argument("--prewarm-templates", action="store_true")
+    parser.add_argument("--timing-log", type=str, default=None)
+    parser.add_argument("--daemon-spool", type=str, default=None)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--exit-when-empty", action="store_true")
+    parser.add_argument("--worker-id", type=str, default=None)
 
     if INSIDE_BLENDER:
         # Run normally
         argv = render_utils.extract_args()
         args = parser.parse_args(argv)
-        main(args)
+        if args.timing_log is not None:
+            timer.open(args.timing_log)
+        if args.render_cache is not None:
+            render_cache = render_io.RenderCache(args.render_cache)
+        if args.async_write > 0:
+            image_writer = render_io.AsyncWriter(args.async_write, args.write_queue, args.image_format)
+        elif args.image_format != "png":
+            raise ValueError("--image-format other than png needs --async-write")
+        if args.async_write > 0 or args.daemon_spool is not None:
+            # flush the queued images and close the open shard when the scheduler stops the worker
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+        if args.benchmark_quality is not None:
+            benchmark_quality(args)
+        elif args.benchmark_frames is not None:
+            benchmark_frames(args)
+        elif args.prewarm_templates:
+            prewarm_templates(args)
+        elif args.daemon_spool is not None:
+            serve(args)
+        else:
+            main(args)
     elif "--help" in sys.argv or "-h" in sys.argv:
         parser.print_help()
     else:
@@ -2,16 +2,31 @@
 This code builds on the following projects:
 - https://github.com/brendel-group/cl-ica
 - https://github.com/ysharma1126/ssl_identifiability
+
+The latents are sampled in chunks of --chunk-size pairs and written into
+memory-mapped m1/m2 raw_latents.npy and latents.npy files, so that memory use
+does not depend on --n-pairs. progress.json records the finished chunks; an
+interrupted run started again with the same arguments resumes after the last
+finished chunk.
+
+The random numbers of a pair are a hash of (--seed, view, factor, pair index),
+see spaces_utils.CounterRNG. A pair does not depend on the pairs before it, so
+chunks can be sampled by --workers processes in parallel, and the latents are
+the same for any number of workers and any chunk size. The sampling arguments
+are saved to latents_config.json: this small file defines the whole dataset,
+sample_latents() recomputes any range of pairs from it, and
+--from-config regenerates (a range of) the arrays.
 """
 import sys
 sys.path.append('../../')
 import os
+import json
 import torch
 import spaces
 import latent_spaces
 import argparse
+import multiprocessing
 import numpy as np
-import pandas as pd
 
 # make sure commands are consistent
 # only one object for fixed position
@@ -19,61 +34,76 @@ import pandas as pd
 # no multinomial noise is one object
 # max classes object 8
 
-def main():
-    parser = argparse.ArgumentParser()
-    # general parameters
-    parser.add_argument("--n-pairs", default=1000000, type=int)
-    parser.add_argument("--n-objects", default=1, type=int)
-    parser.add_argument("--output-folder", required=True, type=str)
-    parser.add_argument("--causal", action="store_true")
+# order of the factors in a latent row, each factor has one column per object
+# except the scene factors, see generate_clevr_dataset_images.py
+SCENE_FACTORS = ["spot_hue", "back_hue", "rotation_spot"]
+OBJECT_FACTORS = [
+    "object_hue",
+    "rotation_object_alpha",
+    "rotation_object_beta",
+    "position_x",
+    "position_y",
+    "position_z",
+    "object",
+]
 
-    # factors of variations
-    parser.add_argument("--object", action="store_true")
-    parser.add_argument("--position", action="store_true")
-    parser.add_argument("--rotation", action="store_true")
-    parser.add_argument("--hue", action="store_true")
+# raw values of the factors that do not vary
+FIXED_VALUES = {
+    "hue": {"spot_hue": 0.0, "back_hue": 1.0, "object_hue": -1.0},
+    "rotation": {"rotation_object_alpha": 1.0, "rotation_object_beta": -1.0, "rotation_spot": -0.5},
+    "position": {"position_x": 0.0, "position_y": 0.0, "position_z": 0.0},
+    "object": {"object": 0.0},
+}
 
-    # structural model
-    parser.add_argument("--object-content", action="store_true")
-    parser.add_argument("--object-style", action="store_true")
-    parser.add_argument("--object-ms", action="store_true")
-    parser.add_argument("--position-content", action="store_true")
-    parser.add_argument("--position-style", action="store_true")
-    parser.add_argument("--position-ms", action="store_true")
-    parser.add_argument("--rotation-content", action="store_true")
-    parser.add_argument("--rotation-style", action="store_true")
-    parser.add_argument("--rotation-ms", action="store_true")
-    parser.add_argument("--hue-content", action="store_true")
-    parser.add_argument("--hue-style", action="store_true")
-    parser.add_argument("--hue-ms", action="store_true")
+PROGRESS_FILE = "progress.json"
+CONFIG_FILE = "latents_config.json"
+# version of the sampling algorithm saved with the config, to be increased
+# whenever the same config gives other latents. Configs without one were
+# written before the counter-based sampling and cannot be reproduced.
+SAMPLER_VERSION = 1
+# arguments that only control which pairs are written where, not their values
+RUN_ARGS = ["n_pairs", "first_pair", "output_folder", "chunk_size", "workers", "from_config", "config_only"]
+VIEWS = ["m1", "m2"]
 
-    # causal relationships
-    parser.add_argument("--intra-content", action="store_true")
-    parser.add_argument("--intra-style", action="store_true")
-    parser.add_argument("--inter-content-style", action="store_true")
+# state of a worker process, see init_worker
+worker = {}
 
-    # generative parameters
-    parser.add_argument("--min", type=float, default=-1.0)
-    parser.add_argument("--max", type=float, default=1.0)
-    parser.add_argument("--continuous-marginal", type=str, default="uniform")
-    parser.add_argument("--continuous-conditional", type=str, default="normal")
-    parser.add_argument("--normal-marginal-std", type=float, default=1.0)
-    parser.add_argument("--normal-conditional-std", type=float, default=1.0)
-    parser.add_argument("--normal-conditional-noise", type=float, default=1.0)
-    parser.add_argument("--uniform-marginal-a", type=float, default=-1.0)
-    parser.add_argument("--uniform-marginal-b", type=float, default=1.0)
-    parser.add_argument("--uniform-conditional-a", type=float, default=-0.1)
-    parser.add_argument("--uniform-conditional-b", type=float, default=0.1)
-    parser.add_argument("--uniform-conditional-noise-a", type=float, default=-0.1)
-    parser.add_argument("--uniform-conditional-noise-b", type=float, default=0.1)
-    parser.add_argument("--multinomial-noise",type=int,default=3)
 
-    args = parser.parse_args()
+def latent_columns(n_objects):
+    """Names of the columns of a latent row."""
+    columns = [f"{factor}_object_0" for factor in SCENE_FACTORS]
+    for factor in OBJECT_FACTORS:
+        columns.extend(f"{factor}_object_{k}" for k in range(n_objects))
+    return columns
+
+
+def fixed_columns(args):
+    """{column: raw value} of the factors that are not sampled."""
+    fixed = {}
+    for group, values in FIXED_VALUES.items():
+        if getattr(args, group):
+            continue
+        for factor, value in values.items():
+            n = 1 if factor in SCENE_FACTORS else args.n_objects
+            for k in range(n):
+                fixed[f"{factor}_object_{k}"] = value
+    return fixed
 
-    os.makedirs(args.output_folder, exist_ok=True)
-    os.makedirs(os.path.join(args.output_folder,"m1"), exist_ok=True)
-    os.makedirs(os.path.join(args.output_folder,"m2"), exist_ok=True)
 
+def blender_scale(columns):
+    """Factor turning each raw latent column into the value used by Blender."""
+    scale = np.ones(len(columns))
+    for i, column in enumerate(columns):
+        if "rotation" in column or "hue" in column:
+            scale[i] = np.pi
+        elif "position" in column:
+            scale[i] = 2.0
+    return scale
+
+
+def build_latent_space(args):
+    """Return the product latent space of the sampled factors, their names and
+    the parameters of their marginal and conditional distributions."""
     # create model partition
     latent_list={"content":{},"style":{},"ms":{}}
     if args.object: 
@@ -102,10 +132,10 @@ def main():
     for part in ["content","style","ms"]:
         if part != "ms": idx_marg, idx_cond = ("normal" if args.continuous_marginal == "normal" else "uniform"), ("normal" if args.continuous_conditional == "normal" else "uniform")
         else: idx_marg, idx_cond = "delta", "delta"
-        dist = {"normal": lambda space, mean, params, size, device: space.normal(mean, params["std"], size, device),
-                "uniform" : lambda space, mean, params, size, device: space.uniform(mean, params["a"], params["b"], size, device),
-                "multinomial" : lambda space, mean, params, size, device: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device),
-                "delta":lambda space, mean, params, size, device: space.delta(size, device=device),}
+        dist = {"normal": lambda space, mean, params, size, device, rng=None: space.normal(mean, params["std"], size, device, rng=rng),
+                "uniform" : lambda space, mean, params, size, device, rng=None: space.trunc_uniform(mean, params["a"], params["b"], size, device, rng=rng),
+                "multinomial" : lambda space, mean, params, size, device, rng=None: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device,rng=rng),
+                "delta":lambda space, mean, params, size, device, rng=None: space.delta(size, device=device, rng=rng),}
         
         marginal, conditional = dist[idx_marg], dist[idx_cond]
 
@@ -113,8 +143,8 @@ def main():
             if k != "object":latent_list[part][k]=latent_spaces.LatentSpace(spaces.NBoxSpace(1,min_=args.min,max_=args.max),marginal,conditional)
             else: latent_list[part][k]=latent_spaces.LatentSpace(
                                     spaces.NBoxSpace(1,min_=args.min,max_=args.max),
-                                    lambda space, mean, params, size, device: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device),
-                                    lambda space, mean, params, size, device: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device))
+                                    lambda space, mean, params, size, device, rng=None: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device,rng=rng),
+                                    lambda space, mean, params, size, device, rng=None: space.multinomial(mean, params["classes"], size, weights=params["weights"], uniform=params["uniform"],device=device,rng=rng))
 
             nb_instances = 1 if ((k not in ["object","position_x","position_y","position_z","rotation_object_alpha","rotation_object_beta","object_hue"]) or (args.n_objects ==1)) else args.n_objects
             for tmp_idx in range(nb_instances):
@@ -132,73 +162,252 @@ def main():
     s = latent_spaces.ProductLatentSpace(list(latent_spaces_list.values())) # add ordered list
     params_marginal={k: v for k,v in zip(np.arange(len(list(latent_spaces_list.values()))),list(params_marginal.values()))}
     params_conditional={k:v for k,v in zip(np.arange(len(list(latent_spaces_list.values()))),list(params_conditional.values()))}
+    return s, list(latent_spaces_list.keys()), params_marginal, params_conditional
+
+
+def sample_chunk(model, columns, fixed, indices, seed):
+    """Sample the pairs of the given indices and return the raw latents of both
+    views as two (len(indices), len(columns)) arrays in the order of columns."""
+    s, names, params_marginal, params_conditional = model
+    views = [np.empty((len(indices), len(columns)), dtype=np.float32) for _ in VIEWS]
+    if names:
+        raw_latents_view1, raw_latents_view2 = s.sample(params_marginal, params_conditional, indices, seed, device="cpu")
+        sampled = [columns.index(name) for name in names]
+        views[0][:, sampled] = raw_latents_view1.numpy()
+        views[1][:, sampled] = raw_latents_view2.numpy()
+    for name, value in fixed.items():
+        for view in views:
+            view[:, columns.index(name)] = value
+    return views
+
+
+def sample_latents(config, indices):
+    """Recompute pairs of a dataset from its latents_config.json (a path or the
+    loaded dict). Returns {view: (raw_latents, latents)} of the given indices,
+    equal to the rows of the arrays written by a full run."""
+    if isinstance(config, str):
+        with open(config) as f:
+            config = json.load(f)
+    check_sampler_version(config)
+    args = argparse.Namespace(**{k: v for k, v in config.items() if k != "sampler_version"})
+    columns = latent_columns(args.n_objects)
+    views = sample_chunk(build_latent_space(args), columns, fixed_columns(args), np.asarray(indices), args.seed)
+    scale = blender_scale(columns)
+    return {view: (raw_latents, (raw_latents * scale).astype(np.float32)) for view, raw_latents in zip(VIEWS, views)}
+
+
+def sampling_config(args):
+    """The arguments that define the content of a dataset."""
+    return {**{k: v for k, v in vars(args).items() if k not in RUN_ARGS}, "sampler_version": SAMPLER_VERSION}
+
+
+def check_sampler_version(config):
+    """Raise if a config was written by another version of the sampling, whose
+    latents this one does not reproduce."""
+    version = config.get("sampler_version")
+    if version != SAMPLER_VERSION:
+        written_by = "an older sampler" if version is None else f"sampler version {version}"
+        raise ValueError(
+            f"The config was written by {written_by}, this is version {SAMPLER_VERSION}: "
+            f"its latents cannot be reproduced"
+        )
+
+
+def open_outputs(folder, n_pairs, n_columns, mode):
+    """Memory-map the raw_latents.npy and latents.npy files of both views,
+    creating them for mode "w+"."""
+    outputs = {}
+    for view in VIEWS:
+        os.makedirs(os.path.join(folder, view), exist_ok=True)
+        for name in ["raw_latents", "latents"]:
+            outputs[view, name] = np.lib.format.open_memmap(
+                os.path.join(folder, view, f"{name}.npy"),
+                mode=mode,
+                dtype=np.float32,
+                shape=(n_pairs, n_columns) if mode == "w+" else None,
+            )
+    return outputs
+
+
+def load_progress(folder):
+    path = os.path.join(folder, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_layout(folder, progress, layout):
+    """Raise if folder holds latents of another layout."""
+    differs = [key for key in layout if progress["layout"].get(key) != layout[key]]
+    if differs:
+        raise ValueError(
+            f"{folder} holds latents generated with another {', '.join(differs)}, "
+            f"cannot resume; use another output folder"
+        )
+
+
+def save_progress(folder, layout, chunks_done, args):
+    path = os.path.join(folder, PROGRESS_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"layout": layout, "chunks_done": chunks_done, "args": vars(args)}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def init_worker(args):
+    """Build the latent space and open the outputs once per process."""
+    # chunks are sampled in parallel by processes, not by torch threads
+    if args.workers > 1:
+        torch.set_num_threads(1)
+    columns = latent_columns(args.n_objects)
+    worker["args"] = args
+    worker["model"] = build_latent_space(args)
+    worker["columns"] = columns
+    worker["fixed"] = fixed_columns(args)
+    worker["scale"] = blender_scale(columns)
+    worker["outputs"] = open_outputs(args.output_folder, args.n_pairs, len(columns), "r+")
+
+
+def write_chunk(chunk):
+    """Sample a chunk and write it to the outputs."""
+    args = worker["args"]
+    start = chunk * args.chunk_size
+    stop = min(start + args.chunk_size, args.n_pairs)
+    indices = np.arange(args.first_pair + start, args.first_pair + stop)
+    views = sample_chunk(worker["model"], worker["columns"], worker["fixed"], indices, args.seed)
+    for view, raw_latents in zip(VIEWS, views):
+        worker["outputs"][view, "raw_latents"][start:stop] = raw_latents
+        # raw latents to latents: rotations and hues to radians, positions to the blender range
+        worker["outputs"][view, "latents"][start:stop] = raw_latents * worker["scale"]
+    for output in worker["outputs"].values():
+        output.flush()
+    return chunk, stop
+
+
+def seed_type(value):
+    """Seeds of the counter-based random numbers, see spaces_utils.CounterRNG."""
+    seed = int(value)
+    if seed < 0:
+        raise argparse.ArgumentTypeError(f"the seed should be a non-negative integer, got {value}")
+    return seed
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    # general parameters
+    parser.add_argument("--n-pairs", default=1000000, type=int)
+    parser.add_argument("--n-objects", default=1, type=int)
+    parser.add_argument("--output-folder", required=True, type=str)
+    parser.add_argument("--causal", action="store_true")
+    parser.add_argument("--chunk-size", default=100000, type=int)
+    parser.add_argument("--workers", default=1, type=int)
+    parser.add_argument("--seed", default=None, type=seed_type)
+    parser.add_argument("--first-pair", default=0, type=int)
+    parser.add_argument("--from-config", default=None, type=str)
+    parser.add_argument("--config-only", action="store_true")
+
+    # factors of variations
+    parser.add_argument("--object", action="store_true")
+    parser.add_argument("--position", action="store_true")
+    parser.add_argument("--rotation", action="store_true")
+    parser.add_argument("--hue", action="store_true")
+
+    # structural model
+    parser.add_argument("--object-content", action="store_true")
+    parser.add_argument("--object-style", action="store_true")
+    parser.add_argument("--object-ms", action="store_true")
+    parser.add_argument("--position-content", action="store_true")
+    parser.add_argument("--position-style", action="store_true")
+    parser.add_argument("--position-ms", action="store_true")
+    parser.add_argument("--rotation-content", action="store_true")
+    parser.add_argument("--rotation-style", action="store_true")
+    parser.add_argument("--rotation-ms", action="store_true")
+    parser.add_argument("--hue-content", action="store_true")
+    parser.add_argument("--hue-style", action="store_true")
+    parser.add_argument("--hue-ms", action="store_true")
+
+    # causal relationships
+    parser.add_argument("--intra-content", action="store_true")
+    parser.add_argument("--intra-style", action="store_true")
+    parser.add_argument("--inter-content-style", action="store_true")
+
+    # generative parameters
+    parser.add_argument("--min", type=float, default=-1.0)
+    parser.add_argument("--max", type=float, default=1.0)
+    parser.add_argument("--continuous-marginal", type=str, default="uniform")
+    parser.add_argument("--continuous-conditional", type=str, default="normal")
+    parser.add_argument("--normal-marginal-std", type=float, default=1.0)
+    parser.add_argument("--normal-conditional-std", type=float, default=1.0)
+    parser.add_argument("--normal-conditional-noise", type=float, default=1.0)
+    parser.add_argument("--uniform-marginal-a", type=float, default=-1.0)
+    parser.add_argument("--uniform-marginal-b", type=float, default=1.0)
+    parser.add_argument("--uniform-conditional-a", type=float, default=-0.1)
+    parser.add_argument("--uniform-conditional-b", type=float, default=0.1)
+    parser.add_argument("--uniform-conditional-noise-a", type=float, default=-0.1)
+    parser.add_argument("--uniform-conditional-noise-b", type=float, default=0.1)
+    parser.add_argument("--multinomial-noise",type=int,default=3)
+    return parser
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.from_config is not None:
+        # the saved sampling arguments become the defaults, the command line still wins
+        with open(args.from_config) as f:
+            config = json.load(f)
+        check_sampler_version(config)
+        del config["sampler_version"]
+        parser.set_defaults(**config)
+        args = parser.parse_args()
 
     # generating latents - causal dep or not
     if args.causal:
         raise NotImplementedError
+
+    os.makedirs(args.output_folder, exist_ok=True)
+    columns = latent_columns(args.n_objects)
+    progress = load_progress(args.output_folder)
+    if args.seed is None:
+        # a resumed run continues the dataset of the interrupted one
+        args.seed = progress["layout"]["seed"] if progress else int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+        print(f"Seed: {args.seed}")
+    config = sampling_config(args)
+    # everything the content of a chunk depends on, a resumed run must match it
+    layout = {**config, "n_pairs": args.n_pairs, "first_pair": args.first_pair, "chunk_size": args.chunk_size}
+    if progress is not None:
+        check_layout(args.output_folder, progress, layout)
+    with open(os.path.join(args.output_folder, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=1)
+    if args.config_only:
+        print(f"Wrote {os.path.join(args.output_folder, CONFIG_FILE)}")
+        return
+
+    if progress is None:
+        open_outputs(args.output_folder, args.n_pairs, len(columns), "w+")
+        chunks_done = 0
+    else:
+        chunks_done = progress["chunks_done"]
+    n_chunks = -(-args.n_pairs // args.chunk_size)
+    if chunks_done:
+        print(f"Resuming after {chunks_done}/{n_chunks} chunks")
+
+    chunks = range(chunks_done, n_chunks)
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args,))
+        results = pool.imap(write_chunk, chunks)
     else:
-        raw_latents_view1 = s.sample_marginal(means=torch.zeros([args.n_pairs,len(latent_spaces_list)]),params=params_marginal,size=args.n_pairs, device="cpu")
-        raw_latents_view2 = pd.DataFrame(s.sample_conditional(means=raw_latents_view1,params=params_conditional,size=args.n_pairs, device="cpu").numpy(),columns=list(latent_spaces_list.keys()))
-        raw_latents_view1 = pd.DataFrame(raw_latents_view1.numpy(),columns=list(latent_spaces_list.keys()))
-
-    # add fixed variables 
-    columns=[]
-    fixed_values=[]
-    if not args.hue:
-        columns.extend(["spot_hue_object_0","back_hue_object_0"]+[f"object_hue_object_{k}" for k in range(args.n_objects)])
-        fixed_values.append(0.0*np.ones([args.n_pairs,1]))
-        fixed_values.append(1.0*np.ones([args.n_pairs,1]))
-        for _ in range(args.n_objects):fixed_values.append(-1.0*np.ones([args.n_pairs,1]))
-    if not args.rotation:
-        columns.extend([f"rotation_object_alpha_object_{k}" for k in range(args.n_objects)]+[f"rotation_object_beta_object_{k}" for k in range(args.n_objects)]+["rotation_spot_object_0"])
-        for _ in range(args.n_objects):fixed_values.append(1.0*np.ones([args.n_pairs,1]))
-        for _ in range(args.n_objects):fixed_values.append(-1.0*np.ones([args.n_pairs,1]))
-        for _ in range(args.n_objects):fixed_values.append(-0.5*np.ones([args.n_pairs,1]))
-    if not args.position:
-        columns.extend([f"position_x_object_{k}" for k in range(args.n_objects)]+[f"position_y_object_{k}" for k in range(args.n_objects)]+[f"position_z_object_{k}" for k in range(args.n_objects)])
-        for _ in range(3*args.n_objects):fixed_values.append(np.zeros([args.n_pairs,1]))
-    if not args.object: 
-        columns.extend([f"object_object_{k}" for k in range(args.n_objects)])
-        for _ in range(args.n_objects):fixed_values.append(np.zeros([args.n_pairs,1]))
-    columns, fixed_values = columns, np.asarray(fixed_values)
-    raw_latents_view1=pd.concat([raw_latents_view1,pd.DataFrame(fixed_values,columns)],axis=1)
-    raw_latents_view2=pd.concat([raw_latents_view2,pd.DataFrame(fixed_values,columns)],axis=1)
-
-    # reorder latents
-    static_list=[]
-    static_list.extend(["spot_hue_object_0","back_hue_object_0","rotation_spot_object_0"])
-    static_list.extend(list(filter(lambda x: x.startswith('object_hue'), list(latent_spaces_list.keys()))))
-    static_list.extend(list(filter(lambda x: x.startswith('rotation_object'), list(latent_spaces_list.keys()))))
-    static_list.extend(list(filter(lambda x: x.startswith('position'), list(latent_spaces_list.keys()))))
-    static_list.extend(list(filter(lambda x: x.startswith('object_object'), list(latent_spaces_list.keys()))))
-    raw_latents_view1=raw_latents_view1.reindex(columns=static_list)
-    raw_latents_view2=raw_latents_view2.reindex(columns=static_list)
-
-    # save raw latents 
-    np.save(os.path.join(args.output_folder, "m1","raw_latents.npy"), raw_latents_view1.to_numpy())
-    np.save(os.path.join(args.output_folder, "m2","raw_latents.npy"), raw_latents_view2.to_numpy())
-
-    # raw latents to latents: rotation
-    rot_cols = raw_latents_view1.filter(like='rotation')
-    raw_latents_view1[rot_cols.columns]=np.pi*rot_cols
-    rot_cols = raw_latents_view2.filter(like='rotation')
-    raw_latents_view2[rot_cols.columns]=np.pi*rot_cols
-
-    # raw latents to latents: hues      
-    hue_cols = raw_latents_view1.filter(like='hue')
-    raw_latents_view1[hue_cols.columns]=np.pi*hue_cols
-    hue_cols = raw_latents_view2.filter(like='hue')
-    raw_latents_view2[hue_cols.columns]=np.pi*hue_cols
-
-    # raw latents to latents: position     
-    pos_cols = raw_latents_view1.filter(like='position')
-    raw_latents_view1[pos_cols.columns]=2*pos_cols
-    pos_cols = raw_latents_view2.filter(like='position')
-    raw_latents_view2[pos_cols.columns]=2*pos_cols
-
-    # save Blender latents
-    np.save(os.path.join(args.output_folder, "m1","latents.npy"), raw_latents_view1.to_numpy())
-    np.save(os.path.join(args.output_folder, "m2","latents.npy"), raw_latents_view2.to_numpy())
+        pool = None
+        init_worker(args)
+        results = map(write_chunk, chunks)
+    # chunks are returned in order, progress always covers a prefix of the chunks
+    for chunk, stop in results:
+        save_progress(args.output_folder, layout, chunk + 1, args)
+        print(f"Chunk {chunk + 1}/{n_chunks}: {stop} pairs")
+    if pool is not None:
+        pool.close()
+        pool.join()
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@ import spaces
 import latent_spaces
 import argparse
 import spaces_utils
+from generate_clevr_dataset_latents import seed_type
 
 
 def main():
@@ -33,11 +34,20 @@ def main():
     parser.add_argument("--first_content", action="store_true")
     parser.add_argument("--strength_dependencies",default=0.5,type=float)
     parser.add_argument("--std",default=1.0,type=float)
+    parser.add_argument("--seed",default=None,type=seed_type)
 
     args = parser.parse_args()
 
     print(args)
 
+    if args.seed is None:
+        args.seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+        print(f"Seed: {args.seed}")
+    # the random numbers of a pair (or point) are a hash of (--seed, view, factor,
+    # index), as in generate_clevr_dataset_latents.py, see spaces_utils.CounterRNG
+    pairs = spaces_utils.CounterRNG(args.seed, np.arange(int(args.n_points/2)))
+    points = spaces_utils.CounterRNG(args.seed, np.arange(args.n_points))
+
     assert not (
         args.position_only and args.rotation_and_color_only
     ), "Only either position-only or rotation-and-color-only can be set"
@@ -72,13 +82,13 @@ def main():
                 [
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(n_non_angular_variables + n_angular_variables-3),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(3,min_=-1.0,max_=1.0),   # original -0.25, 0.25
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                     ),
                 ]
             )
@@ -86,13 +96,13 @@ def main():
             s = latent_spaces.ProductLatentSpace(
                 [   latent_spaces.LatentSpace(
                         spaces.NBoxSpace(3,min_=-1.0,max_=1.0),   # original -0.25, 0.25
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(n_non_angular_variables + n_angular_variables-3),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                     ),
                 ]
             )
@@ -103,57 +113,57 @@ def main():
                         # Positions
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # Rotations
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),                        
                         ##### rotation angle fixed here
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         # spotlight position
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         # Hues
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                     ]
                 )
@@ -163,58 +173,58 @@ def main():
                         # Positions
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         # Rotations
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),                        
                         ##### rotation angle fixed here
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
 
                         # spotlight position
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # Hues
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                     ]
                 )
@@ -225,57 +235,57 @@ def main():
                         # Positions 
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device, rng=rng),
                         ),                    
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         # Rotations
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),                        
                         ##### rotation angle fixed here
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # spotlight position
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # Hues
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                     ]
                 )
@@ -285,57 +295,57 @@ def main():
                         # Positions 
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device, rng=rng),
                         ),                    
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         # Rotations
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),                        
                         ##### rotation angle fixed here
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         # spotlight position
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         # Hues
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                     ]
                 )
@@ -345,54 +355,54 @@ def main():
                     [
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                         ),
                         # removed second rotation
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                     ]
                 )
@@ -401,54 +411,54 @@ def main():
                     [
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean,std,size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean,std,size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                         ),
                         # removed second rotation
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, mean, std, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                     ]
                 )
@@ -460,47 +470,47 @@ def main():
                         # Positions 
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.uniform(size, device),
+                            lambda space, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.uniform(size, device, rng=rng),
                         ),                    
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         # Rotations
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),                        
                         ##### rotation angle fixed here
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.delta(size, device=device),
-                            lambda space, mean, std, size, device: space.delta(size, device=device),
+                            lambda space, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                         ),
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # spotlight position
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(1),
-                            lambda space, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                            lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                         ),
                         # Hues
                         latent_spaces.LatentSpace(
                             spaces.NBoxSpace(3),
-                            lambda space, size, device: space.uniform(size, device=device),
-                            lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                            lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                            lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                         ),
                     ]
                 )
@@ -509,28 +519,28 @@ def main():
             #     [
             #         latent_spaces.LatentSpace(
             #             spaces.NBoxSpace(3),
-            #             lambda space, size, device: space.uniform(size, device=device),
-            #             lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+            #             lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+            #             lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
             #         ),
             #         latent_spaces.LatentSpace(
             #             spaces.NBoxSpace(n_non_angular_variables + n_angular_variables-3-3),
-            #             lambda space, size, device: space.uniform(size, device=device),
-            #             lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+            #             lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+            #             lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
             #         ),
             #         latent_spaces.LatentSpace(
             #             spaces.NBoxSpace(1),
-            #             lambda space, size, device: space.uniform(size, device=device),
-            #             lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+            #             lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+            #             lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
             #         ),
             #         latent_spaces.LatentSpace(
             #             spaces.NBoxSpace(1),
-            #             lambda space, size, device: space.uniform(size, device=device),
-            #             lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+            #             lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+            #             lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
             #         ),
             #         latent_spaces.LatentSpace(
             #             spaces.NBoxSpace(1),
-            #             lambda space, size, device: space.uniform(size, device=device),
-            #             lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+            #             lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+            #             lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
             #         ),
             #     ]
             # )
@@ -541,28 +551,28 @@ def main():
                 [
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(3),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(n_non_angular_variables + n_angular_variables-3-3),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.trunc_normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.trunc_normal(mean, std, size, device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(1),
-                        lambda space, size, device: space.delta(size, device=device),
-                        lambda space, mean, std, size, device: space.uniform(size, device=device),
+                        lambda space, size, device, rng=None: space.delta(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(1),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.normal(mean, std, size, device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.normal(mean, std, size, device, rng=rng),
                     ),
                     latent_spaces.LatentSpace(
                         spaces.NBoxSpace(1),
-                        lambda space, size, device: space.uniform(size, device=device),
-                        lambda space, mean, std, size, device: space.delta(size, device=device),
+                        lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
+                        lambda space, mean, std, size, device, rng=None: space.delta(size, device=device, rng=rng),
                     ),
                 ]
             )
@@ -572,7 +582,7 @@ def main():
         else:
             s = latent_spaces.LatentSpace(
                 spaces.NBoxSpace(n_non_angular_variables + n_angular_variables),
-                lambda space, size, device: space.uniform(size, device=device),
+                lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                 None,
             )
             
@@ -582,12 +592,12 @@ def main():
             [
                 latent_spaces.LatentSpace(
                     spaces.NBoxSpace(n_non_angular_variables),
-                    lambda space, size, device: space.uniform(size, device=device),
+                    lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                     None,
                 ),
                 latent_spaces.LatentSpace(
                     spaces.NSphereSpace(n_angular_variables + 1),
-                    lambda space, size, device: space.uniform(size, device=device),
+                    lambda space, size, device, rng=None: space.uniform(size, device=device, rng=rng),
                     None,
                 ),
             ]
@@ -595,8 +605,8 @@ def main():
 
     if args.deterministic: 
         if args.mi:
-            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu")
-            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,1.0], size=int(args.n_points/2), device="cpu").numpy()   # [1.0,0.5] for mi originally 
+            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu", rng=pairs.stream(0))
+            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,1.0], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()   # [1.0,0.5] for mi originally 
             raw_latents_view1 = raw_latents_view1.numpy()
             #if args.all_hues: 
             #    raw_latents_view2[:7] = raw_latents_view1[:7]
@@ -604,8 +614,8 @@ def main():
 
             raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
         elif args.basic:
-            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu")
-            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[1.0,0.0], size=int(args.n_points/2), device="cpu").numpy()   # [1.0,0.5] for mi originally 
+            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu", rng=pairs.stream(0))
+            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[1.0,0.0], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()   # [1.0,0.5] for mi originally 
             raw_latents_view1 = raw_latents_view1.numpy()
             #if args.all_hues: 
             #    raw_latents_view2[:7] = raw_latents_view1[:7]
@@ -615,13 +625,13 @@ def main():
 
         elif args.multimodal and args.all_hues:
             if args.first_content:
-                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,None,None,None,args.strength_dependencies,args.strength_dependencies,None,None,None],int(args.n_points/2), device="cpu",ms="hues")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,0.0,0.0,args.std,None,args.std,args.std,None,None,None], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,None,None,None,args.strength_dependencies,args.strength_dependencies,None,None,None],int(args.n_points/2), device="cpu",ms="hues", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,0.0,0.0,args.std,None,args.std,args.std,None,None,None], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
             else:
-                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,args.strength_dependencies,None,None,args.strength_dependencies,None,None,None,None],int(args.n_points/2), device="cpu",ms="hues")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[args.std,args.std,args.std,0.0,None,0.0,0.0,None,None,None], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,args.strength_dependencies,None,None,args.strength_dependencies,None,None,None,None],int(args.n_points/2), device="cpu",ms="hues", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[args.std,args.std,args.std,0.0,None,0.0,0.0,None,None,None], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 print(raw_latents_view1.shape,raw_latents_view2.shape)
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
@@ -629,42 +639,42 @@ def main():
 
         elif args.multimodal and args.all_positions:
             if args.first_content:
-                raw_latents_view1 = s.sample_marginal_causal([None,None,None,None,None,args.strength_dependencies,None,args.strength_dependencies,None,args.strength_dependencies],int(args.n_points/2), device="cpu",ms="positions")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,0.0,None,0.0,0.0,args.std,args.std,args.std], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([None,None,None,None,None,args.strength_dependencies,None,args.strength_dependencies,None,args.strength_dependencies],int(args.n_points/2), device="cpu",ms="positions", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,0.0,None,0.0,0.0,args.std,args.std,args.std], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
             else:
-                raw_latents_view1 = s.sample_marginal_causal([None,None,None,None,None,args.strength_dependencies,args.strength_dependencies,args.strength_dependencies,None,None],int(args.n_points/2), device="cpu",ms="positions")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,args.std,None,args.std,args.std,0.0,0.0,0.0], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([None,None,None,None,None,args.strength_dependencies,args.strength_dependencies,args.strength_dependencies,None,None],int(args.n_points/2), device="cpu",ms="positions", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,args.std,None,args.std,args.std,0.0,0.0,0.0], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0) 
 
 
         elif args.multimodal and args.all_rotations:
             if args.first_content:
-                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,None,None,None,None,None,args.strength_dependencies,None,args.strength_dependencies],int(args.n_points/2), device="cpu",ms="rotations")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,0.0,0.0,None,None,None,None,args.std,args.std,args.std], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,None,None,None,None,None,args.strength_dependencies,None,args.strength_dependencies],int(args.n_points/2), device="cpu",ms="rotations", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[0.0,0.0,0.0,None,None,None,None,args.std,args.std,args.std], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
             else:
-                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,args.strength_dependencies,None,None,None,None,args.strength_dependencies,None,None],int(args.n_points/2), device="cpu",ms="rotations")
-                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[args.std,args.std,args.std,None,None,None,None,0.0,0.0,0.0], size=int(args.n_points/2), device="cpu").numpy()
+                raw_latents_view1 = s.sample_marginal_causal([args.strength_dependencies,None,args.strength_dependencies,None,None,None,None,args.strength_dependencies,None,None],int(args.n_points/2), device="cpu",ms="rotations", rng=pairs.stream(0))
+                raw_latents_view2 = s.sample_conditional(raw_latents_view1,[args.std,args.std,args.std,None,None,None,None,0.0,0.0,0.0], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
                 raw_latents_view1 = raw_latents_view1.numpy()
                 raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
 
         elif args.debug:
-            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu")
-            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,None,None,0.0,0.0,args.std], size=int(args.n_points/2), device="cpu").numpy()
+            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu", rng=pairs.stream(0))
+            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[None,None,None,None,None,0.0,0.0,args.std], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
             raw_latents_view1 = raw_latents_view1.numpy()
             raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
         
         elif args.debug2:
-            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu")
-            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[1.0,0.2,None,0.2,None], size=int(args.n_points/2), device="cpu").numpy()
+            raw_latents_view1 = s.sample_marginal(int(args.n_points/2), device="cpu", rng=pairs.stream(0))
+            raw_latents_view2 = s.sample_conditional(raw_latents_view1,[1.0,0.2,None,0.2,None], size=int(args.n_points/2), device="cpu", rng=pairs.stream(1)).numpy()
             raw_latents_view1 = raw_latents_view1.numpy()
             raw_latents = np.append(raw_latents_view1,raw_latents_view2,0)
          
-        else: raw_latents = s.sample_marginal(args.n_points, device="cpu").numpy()
+        else: raw_latents = s.sample_marginal(args.n_points, device="cpu", rng=points.stream(0)).numpy()
 
     if args.position_only or args.rotation_and_color_only:
         assert args.n_objects == 1, "Only one object is supported for fixed variables"
@@ -1,7 +1,8 @@
 """Classes that combine spaces with specific probability densities."""
 
 from typing import Callable, List
-from spaces import Space
+from spaces import Space, NBoxSpace
+import spaces_utils as sut
 import torch
 
 
@@ -47,52 +48,137 @@ class LatentSpace:
 
 
 class ProductLatentSpace(LatentSpace):
-    """A latent space which is the cartesian product of other latent spaces."""
+    """A latent space which is the cartesian product of other latent spaces.
+
+    Sampling goes through a plan compiled once per set of parameters: 1-D box
+    factors sharing their sampler, box and parameters are sampled in a single
+    (size, k) call written into a slice of one output tensor.
+    """
 
     def __init__(self, spaces: List[LatentSpace]):
         self.spaces = spaces
+        self._plans = {}
+
+    def compile(self, kind, params):
+        """Group the factors for sampling their kind ("marginal" or
+        "conditional") distribution with params. Returns a list of
+        (sampler, space, factor indices, column indices) tuples."""
+        key = (kind, repr(params))
+        if key in self._plans:
+            return self._plans[key]
+        groups = {}
+        plan = []
+        column = 0
+        for i, s in enumerate(self.spaces):
+            sampler = s._sample_marginal if kind == "marginal" else s._sample_conditional
+            if sampler is None:
+                raise RuntimeError(f"sample_{kind} was not set")
+            columns = list(range(column, column + s.dim))
+            column += s.dim
+            if isinstance(s.space, NBoxSpace) and s.dim == 1:
+                group = (sampler, s.space.min_, s.space.max_, repr(params[i]))
+                if group not in groups:
+                    groups[group] = [sampler, None, [], []]
+                    plan.append(groups[group])
+                groups[group][2].append(i)
+                groups[group][3].extend(columns)
+            else:
+                plan.append([sampler, s.space, [i], columns])
+        for entry in plan:
+            if entry[1] is None:
+                # a fused group samples all its factors in one box of its size
+                box = self.spaces[entry[2][0]].space
+                entry[1] = NBoxSpace(len(entry[2]), min_=box.min_, max_=box.max_)
+        plan = [tuple(entry) for entry in plan]
+        self._plans[key] = plan
+        return plan
+
+    def _sample(self, kind, means, params, size, rng=None, **kwargs):
+        result = torch.empty((size, self.dim), device=kwargs.get("device"))
+        for sampler, space, factors, columns in self.compile(kind, params):
+            if rng is not None:
+                kwargs["rng"] = rng.streams(factors) if len(factors) > 1 else rng.stream(factors[0])
+            mean = means[..., columns]
+            if len(factors) == 1 and space.dim == 1:
+                mean = mean[..., 0]
+            values = sampler(space, mean, params[factors[0]], size=size, **kwargs)
+            if len(columns) == columns[-1] - columns[0] + 1:
+                result[:, columns[0]:columns[-1] + 1] = values
+            else:
+                result[:, columns] = values
+        return result
+
+    def sample_conditional(self, means, params, size, rng=None, **kwargs):
+        return self._sample("conditional", means, params, size, rng=rng, **kwargs)
 
-    def sample_conditional(self, means, params, size, **kwargs):
+    def sample_marginal(self, means, params, size, rng=None, **kwargs):
+        return self._sample("marginal", means, params, size, rng=rng, **kwargs)
+
+    def sample_conditional_per_factor(self, means, params, size, rng=None, **kwargs):
+        """Reference implementation of sample_conditional, one factor at a time."""
         x = []
         for i, s in enumerate(self.spaces):
             if len(means.shape) == 1:
                 z_s = means[i]
             else:
                 z_s = means[:, i]
+            if rng is not None:
+                kwargs["rng"] = rng.stream(i)
             x.append(s.sample_conditional(mean=z_s, params=params[i], size=size, **kwargs))
         return torch.cat(x, -1)
 
-    def sample_marginal(self, means, params, size, **kwargs):
-        x = [s.sample_marginal(means[:,i], params[i], size=size, **kwargs) for i, s in enumerate(self.spaces)]
+    def sample_marginal_per_factor(self, means, params, size, rng=None, **kwargs):
+        """Reference implementation of sample_marginal, one factor at a time."""
+        x = []
+        for i, s in enumerate(self.spaces):
+            if rng is not None:
+                kwargs["rng"] = rng.stream(i)
+            x.append(s.sample_marginal(means[:,i], params[i], size=size, **kwargs))
         return torch.cat(x, -1)
 
-    def sample_marginal_causal(self, std, size, first_content, **kwargs):
-        x = [s.sample_marginal(torch.as_tensor([0.0]),torch.as_tensor([0.0]), size=size, **kwargs) for i, s in enumerate(self.spaces)]
+    def sample(self, params_marginal, params_conditional, indices, seed, **kwargs):
+        """Sample the pairs of the given indices of the dataset defined by seed.
+
+        The random numbers of a pair are keyed by (seed, view, factor, index),
+        so the rows of any subset of indices are the ones sampling all indices
+        gives. Returns the (len(indices), dim) latents of both views.
+        """
+        rng = sut.CounterRNG(seed, indices)
+        size = len(rng)
+        z1 = self.sample_marginal(torch.zeros([size, len(self.spaces)]), params_marginal, size, rng=rng.stream(0), **kwargs)
+        z2 = self.sample_conditional(z1, params_conditional, size, rng=rng.stream(1), **kwargs)
+        return z1, z2
+
+    def sample_marginal_causal(self, std, size, first_content, rng=None, **kwargs):
+        # factor i is drawn from rng.stream(i), its dependent draws from the following streams
+        n = len(self.spaces)
+        stream = lambda k: {} if rng is None else {"rng": rng.stream(k)}
+        x = [s.sample_marginal(torch.as_tensor([0.0]),torch.as_tensor([0.0]), size=size, **kwargs, **stream(i)) for i, s in enumerate(self.spaces)]
         final_x = []
         for i, s in enumerate(self.spaces):
             if i==1 and std[i] is not None:
                 if first_content:
-                    final_x.append(s.sample_marginal(x[-4],std[i]))
+                    final_x.append(s.sample_marginal(x[-4],std[i],**stream(n + i)))
                 else:
-                    final_x.append(s.sample_marginal(x[-2],std[i]))
+                    final_x.append(s.sample_marginal(x[-2],std[i],**stream(n + i)))
             elif i==6 and std[i] is not None:
                 if first_content:
-                    final_x.append(s.sample_marginal(x[1],std[i]))
+                    final_x.append(s.sample_marginal(x[1],std[i],**stream(n + i)))
                 else:
-                    final_x.append(s.sample_marginal(x[-2],std[i]))
+                    final_x.append(s.sample_marginal(x[-2],std[i],**stream(n + i)))
             elif i==8 and std[i] is not None:
                 if first_content:
-                    final_x.append(s.sample_marginal(x[-4],std[i]))
+                    final_x.append(s.sample_marginal(x[-4],std[i],**stream(n + i)))
                 else:
-                    final_x.append(s.sample_marginal(x[1],std[i]))
+                    final_x.append(s.sample_marginal(x[1],std[i],**stream(n + i)))
             elif i in (0,2,3,4,5,7,9): final_x.append(x[i])
 
         final_final_x = []
         for i, s in enumerate(self.spaces):
 
-            if i==0 and std[i] is not None: final_final_x.append(s.sample_marginal(x[1],std[i]))
-            elif i==5 and std[i] is not None:final_final_x.append(s.sample_marginal(x[-4],std[i]))
-            elif i==7 and std[i] is not None:final_final_x.append(s.sample_marginal(x[-2],std[i]))
+            if i==0 and std[i] is not None: final_final_x.append(s.sample_marginal(x[1],std[i],**stream(2 * n + i)))
+            elif i==5 and std[i] is not None:final_final_x.append(s.sample_marginal(x[-4],std[i],**stream(2 * n + i)))
+            elif i==7 and std[i] is not None:final_final_x.append(s.sample_marginal(x[-2],std[i],**stream(2 * n + i)))
             elif i in (1,2,3,4,6,8,9): final_x.append(x[i])
 
         return torch.cat(final_final_x, -1)
@@ -100,3 +186,36 @@ class ProductLatentSpace(LatentSpace):
     @property
     def dim(self):
         return sum([s.dim for s in self.spaces])
+
+
+if __name__ == "__main__":
+    # compare the fused and per-factor sampling of the latents of
+    # generate_clevr_dataset_latents.py for several numbers of objects
+    import timeit
+    import argparse
+    import generate_clevr_dataset_latents as gen
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default=10000, type=int)
+    parser.add_argument("--objects", nargs="+", type=int, default=[1, 4, 10])
+    parser.add_argument("--repeat", default=5, type=int)
+    args = parser.parse_args()
+
+    for n_objects in args.objects:
+        config = gen.get_parser().parse_args([
+            "--output-folder", "", "--n-objects", str(n_objects),
+            "--object", "--position", "--rotation", "--hue",
+            "--object-content", "--position-style", "--rotation-style", "--hue-content",
+        ])
+        s, names, params_marginal, params_conditional = gen.build_latent_space(config)
+        means = torch.zeros([args.size, len(names)])
+        z = s.sample_marginal(means, params_marginal, args.size, device="cpu")
+        print(f"{n_objects} objects, {len(names)} factors in {len(s.compile('conditional', params_conditional))} groups, {args.size} samples")
+        runs = {
+            "marginal": (s.sample_marginal, s.sample_marginal_per_factor, means, params_marginal),
+            "conditional": (s.sample_conditional, s.sample_conditional_per_factor, z, params_conditional),
+        }
+        for kind, (fused, per_factor, m, params) in runs.items():
+            t_fused = min(timeit.repeat(lambda: fused(m, params, args.size, device="cpu"), number=1, repeat=args.repeat))
+            t_ref = min(timeit.repeat(lambda: per_factor(m, params, args.size, device="cpu"), number=1, repeat=args.repeat))
+            print(f"  {kind:<12} fused {1000 * t_fused:8.2f} ms  per factor {1000 * t_ref:8.2f} ms  speed-up {t_ref / t_fused:5.1f}x")
@@ -0,0 +1,638 @@
+"""Helpers to keep track of rendered outputs.
+
+    python render_io.py compact example/m1/images --fanout 1000
+"""
+
+import io
+import os
+import zlib
+import queue
+import struct
+import shutil
+import threading
+import json
+import glob
+import time
+import hashlib
+import argparse
+import tarfile
+import numpy as np
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """Return the sha1 hex digest of a file."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def partial_path(path):
+    """Temporary path a file is written to before being renamed to its final path."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.partial{ext}"
+
+
+def passes_path(path):
+    """Path of the segmentation, depth and normal passes saved next to an image."""
+    root, _ = os.path.splitext(path)
+    return f"{root}_passes.npz"
+
+
+class RenderJournal:
+    """Append-only record of the samples rendered into an output folder.
+
+    Every writer (e.g. one per batch) appends one JSON line per finished sample
+    to its own segment in `<folder>/journal/`, so concurrent batches never write
+    to the same file. Outputs are only recorded once they have been renamed to
+    their final path, hence a sample interrupted while being written is never
+    considered done. Loading reads the few segment files once instead of
+    checking every output file.
+
+    With a fanout, images are spread over sub-folders of fanout images each,
+    e.g. 012/345.png for sample 12345, so that no folder holds more than
+    fanout files. compact writes `<folder>/index.json`, which describes the
+    layout and the rendered samples, see load_index.
+    """
+
+    def __init__(self, folder, writer="main", ext=".png", fanout=None):
+        self.folder = os.path.join(folder, "journal")
+        self.path = os.path.join(self.folder, f"{writer}.jsonl")
+        self.ext = ext
+        self.fanout = fanout
+        self.entries = {}
+        os.makedirs(self.folder, exist_ok=True)
+        index = load_index(folder)
+        if index is not None and (index["fanout"], index["ext"]) != (fanout, ext):
+            raise ValueError(
+                f"{folder} holds images with fanout {index['fanout']} and extension {index['ext']}"
+            )
+        self.load()
+        self._terminate_torn_line()
+
+    def load(self):
+        """(Re)load all segments of the journal."""
+        self.entries = load_entries(self.folder)
+        return self.entries
+
+    def _terminate_torn_line(self):
+        # a writer killed mid-write leaves an incomplete last line that the next
+        # record must not be appended to
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def __contains__(self, index):
+        return int(index) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def remaining(self, indices):
+        """Return the indices that have not been rendered yet, in the given order."""
+        return [idx for idx in indices if int(idx) not in self.entries]
+
+    def image_path(self, index):
+        """Path the image of a sample is written to."""
+        return os.path.join(os.path.dirname(self.folder), relative_image_path(index, self.ext, self.fanout))
+
+    def close(self):
+        # samples are recorded as they finish, index.json is only written by compact
+        pass
+
+    def write_index(self):
+        """Write index.json from all segments of the journal. Concurrent writers
+        could replace it with an older snapshot, see compact."""
+        self.load()
+        indices = np.array(sorted(self.entries), dtype=np.int64)
+        # consecutive indices are stored as [start, stop) ranges
+        breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+        ranges = [[int(run[0]), int(run[-1]) + 1] for run in np.split(indices, breaks) if len(run)]
+        index = {"ext": self.ext, "fanout": self.fanout, "n_images": len(indices), "ranges": ranges}
+        path = os.path.join(os.path.dirname(self.folder), "index.json")
+        tmp = f"{path}.tmp.{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+        return index
+
+    def record(self, index, output_path, render_seconds, **extra):
+        """Record a finished output; the file must already be at its final path."""
+        entry = {
+            "index": int(index),
+            "path": os.path.relpath(output_path, os.path.dirname(self.folder)),
+            "bytes": os.path.getsize(output_path),
+            "sha1": file_checksum(output_path),
+            "seconds": round(float(render_seconds), 4),
+        }
+        entry.update(extra)
+        self._append([entry])
+        return entry
+
+    def record_many(self, indices, output_path, render_seconds, **extra):
+        """Record several samples stored in the same output file, e.g. a shard."""
+        size = os.path.getsize(output_path)
+        checksum = file_checksum(output_path)
+        path = os.path.relpath(output_path, os.path.dirname(self.folder))
+        entries = []
+        for index, seconds in zip(indices, render_seconds):
+            entry = {
+                "index": int(index),
+                "path": path,
+                "bytes": size,
+                "sha1": checksum,
+                "seconds": round(float(seconds), 4),
+            }
+            entry.update(extra)
+            entries.append(entry)
+        self._append(entries)
+        return entries
+
+    def _append(self, entries):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self.entries[entry["index"]] = entry
+
+    def compact(self):
+        """Merge all segments into a single one, written through a temporary
+        file and a rename. Only call this when no other writer is running."""
+        segments = sorted(glob.glob(os.path.join(self.folder, "*.jsonl")))
+        self.load()
+        merged = os.path.join(self.folder, "merged.jsonl")
+        tmp = merged + ".tmp"
+        with open(tmp, "w") as f:
+            for index in sorted(self.entries):
+                f.write(json.dumps(self.entries[index]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, merged)
+        for segment in segments:
+            if segment != merged:
+                os.remove(segment)
+        self.write_index()
+        return merged
+
+
+def load_entries(journal_folder):
+    """Map the index of every sample recorded in the segments of a journal folder
+    to its entry."""
+    entries = {}
+    for segment in sorted(glob.glob(os.path.join(journal_folder, "*.jsonl"))):
+        with open(segment) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of a writer that was killed mid-write
+                    continue
+                entries[int(entry["index"])] = entry
+    return entries
+
+
+def relative_image_path(index, ext=".png", fanout=None):
+    """Path of the image of a sample relative to its folder."""
+    index = int(index)
+    if fanout is None:
+        return f"{index:06d}{ext}"
+    width = len(str(fanout - 1))
+    return os.path.join(f"{index // fanout:03d}", f"{index % fanout:0{width}d}{ext}")
+
+
+def load_index(folder):
+    """Return the content of `<folder>/index.json`, or None if there is none."""
+    path = os.path.join(folder, "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def image_paths(folder):
+    """Map the index of every rendered sample of an image folder to the path of
+    its image, using index.json instead of listing the folder. The journal is
+    read instead if samples were recorded since it was last compacted."""
+    index = load_index(folder)
+    segments = [os.path.basename(s) for s in glob.glob(os.path.join(folder, "journal", "*.jsonl"))]
+    if index is None or any(segment != "merged.jsonl" for segment in segments):
+        if not segments:
+            raise ValueError(f"{folder} has no index.json and no journal")
+        entries = load_entries(os.path.join(folder, "journal"))
+        return {i: os.path.join(folder, entry["path"]) for i, entry in sorted(entries.items())}
+    return {
+        i: os.path.join(folder, relative_image_path(i, index["ext"], index["fanout"]))
+        for start, stop in index["ranges"]
+        for i in range(start, stop)
+    }
+
+
+class RenderCache:
+    """Content-addressed store of rendered images.
+
+    Files are stored under the hash of everything that determines the image,
+    see render_key in generate_clevr_dataset_images.py, so samples whose scene
+    was already rendered (repeated latents, re-running after a change of the
+    labels only) are linked or copied from the cache instead of being rendered
+    again. Files are added with a rename, so concurrent writers never expose a
+    partial file.
+    """
+
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key, suffix):
+        return os.path.join(self.folder, key[:2], f"{key}{suffix}")
+
+    def fetch(self, key, files):
+        """Link or copy the cached files of key to the paths given as
+        {suffix: path}. Returns False, without touching any path, if one of
+        them is not cached."""
+        if not all(os.path.exists(self.path(key, suffix)) for suffix in files):
+            self.misses += 1
+            return False
+        for suffix, path in files.items():
+            _link_or_copy(self.path(key, suffix), path)
+        self.hits += 1
+        return True
+
+    def store(self, key, files):
+        """Add the files given as {suffix: path} to the cache."""
+        for suffix, path in files.items():
+            os.makedirs(os.path.dirname(self.path(key, suffix)), exist_ok=True)
+            _link_or_copy(path, self.path(key, suffix))
+
+    def fetch_array(self, key, files=None):
+        """Return the cached pixels of key, or None. The other cached files of
+        key given as {suffix: path}, e.g. its passes, are linked or copied as
+        with fetch; None is returned, without touching any path, if one of
+        them is not cached."""
+        files = files or {}
+        if not all(os.path.exists(self.path(key, suffix)) for suffix in [".npy", *files]):
+            self.misses += 1
+            return None
+        for suffix, path in files.items():
+            _link_or_copy(self.path(key, suffix), path)
+        self.hits += 1
+        return np.load(self.path(key, ".npy"))
+
+    def store_array(self, key, pixels, files=None):
+        """Add the pixels of key, and the files given as {suffix: path}, to the cache."""
+        path = self.path(key, ".npy")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}.npy"
+        np.save(tmp, pixels)
+        os.replace(tmp, path)
+        self.store(key, files or {})
+
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+
+def _link_or_copy(source, destination):
+    """Hard-link source to destination, or copy it across file systems. The
+    file is created under a temporary name and renamed into place."""
+    root, ext = os.path.splitext(destination)
+    tmp = f"{root}.{os.getpid()}.partial{ext}"
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, destination)
+
+
+def linear_to_srgb(pixels):
+    """Convert linear RGB(A) float pixels to 8-bit sRGB, as written to PNG files
+    with the Standard view transform. Alpha is dropped."""
+    rgb = np.clip(pixels[..., :3], 0.0, 1.0)
+    srgb = np.where(
+        rgb <= 0.0031308, 12.92 * rgb, 1.055 * np.power(rgb, 1.0 / 2.4) - 0.055
+    )
+    return np.round(srgb * 255.0).astype(np.uint8)
+
+
+def _open_or_create_memmap(path, shape, dtype):
+    """Open a .npy file as a writable memmap, creating it if it does not exist.
+    Several batches may race to create the file: it is written under a
+    temporary name and hard-linked into place, which fails if another process
+    was faster, so existing rows are never overwritten."""
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp.{os.getpid()}"
+        np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape).flush()
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    array = np.lib.format.open_memmap(path, mode="r+")
+    if array.shape != tuple(shape) or array.dtype != np.dtype(dtype):
+        raise ValueError(f"{path} has shape {array.shape} and dtype {array.dtype}, expected {shape} and {dtype}")
+    return array
+
+
+class ArrayStore:
+    """Rendered images stored as the rows of a single N x H x W x 3 uint8 .npy file.
+
+    `<folder>/images.npy` can be opened by a dataloader with
+    np.load(path, mmap_mode="r"). `<folder>/images_done.npy` flags the rows
+    that were completely written, a row is only flagged after its pixels have
+    been flushed to disk. Rows are independent, so batches rendering disjoint
+    samples can write to the same store concurrently.
+    """
+
+    def __init__(self, folder, n_samples, height, width, name="images"):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"{name}.npy")
+        self.done_path = os.path.join(folder, f"{name}_done.npy")
+        self.images = _open_or_create_memmap(self.path, (n_samples, height, width, 3), np.uint8)
+        self.done = _open_or_create_memmap(self.done_path, (n_samples,), np.uint8)
+
+    def __contains__(self, index):
+        return bool(self.done[int(index)])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.done))
+
+    def remaining(self, indices):
+        """Return the indices that have not been rendered yet, in the given order."""
+        return [idx for idx in indices if not self.done[int(idx)]]
+
+    def image_path(self, index):
+        """Name of a sample, no image file is written to this path."""
+        return os.path.join(os.path.dirname(self.path), f"{int(index):06d}.png")
+
+    def write(self, index, pixels):
+        """Store the (H, W, 3) uint8 image of a sample and flag it as done."""
+        self.images[int(index)] = pixels
+        self.images.flush()
+        self.done[int(index)] = 1
+        self.done.flush()
+
+    def close(self):
+        self.images.flush()
+        self.done.flush()
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(array))
+    return buffer.getvalue()
+
+
+class ShardWriter:
+    """Streams samples into rolling tar shards following the WebDataset layout:
+    all members of a sample share the sample key as prefix, e.g.
+    000042.m1.png, 000042.m1.latents.npy, 000042.m2.png, ...
+
+    A shard is written under a temporary name and renamed once it holds at
+    least max_bytes, or when the writer is closed. on_close(path, keys) is
+    called for every finished shard.
+    """
+
+    def __init__(self, folder, prefix, max_bytes, on_close=None):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.on_close = on_close
+        existing = glob.glob(os.path.join(folder, f"{prefix}-*.tar"))
+        self.n_shards = len([p for p in existing if not p.endswith(".partial.tar")])
+        self.tar = None
+        self.path = None
+        self.keys = []
+
+    def write(self, key, members):
+        """Add a sample given as a dict mapping member suffixes to bytes."""
+        if self.tar is None:
+            self.path = os.path.join(self.folder, f"{self.prefix}-{self.n_shards:06d}.tar")
+            self.tar = tarfile.open(partial_path(self.path), "w")
+        for name, data in members.items():
+            info = tarfile.TarInfo(f"{key}.{name}")
+            info.size = len(data)
+            info.mtime = time.time()
+            self.tar.addfile(info, io.BytesIO(data))
+        self.keys.append(key)
+        if self.tar.fileobj.tell() >= self.max_bytes:
+            self.close()
+
+    def close(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        os.replace(partial_path(self.path), self.path)
+        if self.on_close is not None:
+            self.on_close(self.path, self.keys)
+        self.tar = None
+        self.keys = []
+        self.n_shards += 1
+
+
+class ShardOutput:
+    """Writes the images of all views of a sample, together with the latents
+    and raw latents of every view, as one sample of a tar shard.
+
+    Samples are recorded in the journal of the shard folder once the shard
+    holding them is complete, so samples of a shard that was interrupted are
+    rendered again.
+
+    With keep_open, closing the views of a batch leaves the current shard open
+    so that the next batches keep filling it, e.g. for the many small jobs of
+    a daemon worker; close() must then be called when the worker stops.
+    """
+
+    def __init__(self, folder, writer, max_bytes, ext=".png", keep_open=False):
+        self.folder = folder
+        self.ext = ext
+        self.keep_open = keep_open
+        self.journal = RenderJournal(folder, writer=writer)
+        self.shards = ShardWriter(folder, writer, max_bytes, on_close=self._shard_closed)
+        self.view_names = []
+        self.pending = {}
+        self.seconds = {}
+
+    def view(self, name, latents, raw_latents=None):
+        """Output handle of one view, used like a RenderJournal by the render loop."""
+        if name not in self.view_names:
+            self.view_names.append(name)
+        return ShardView(self, name, latents, raw_latents)
+
+    def add(self, index, name, image_path, latents, raw_latents, seconds):
+        index = int(index)
+        members = self.pending.setdefault(index, {})
+        with open(image_path, "rb") as f:
+            members[f"{name}{self.ext}"] = f.read()
+        os.remove(image_path)
+        if os.path.exists(passes_path(image_path)):
+            with open(passes_path(image_path), "rb") as f:
+                members[f"{name}.passes.npz"] = f.read()
+            os.remove(passes_path(image_path))
+        members[f"{name}.latents.npy"] = _npy_bytes(latents[index])
+        if raw_latents is not None:
+            members[f"{name}.raw_latents.npy"] = _npy_bytes(raw_latents[index])
+        self.seconds[index] = self.seconds.get(index, 0.0) + seconds
+        if all(f"{view_name}{self.ext}" in members for view_name in self.view_names):
+            self.shards.write(f"{index:06d}", self.pending.pop(index))
+
+    def _shard_closed(self, path, keys):
+        indices = [int(key) for key in keys]
+        self.journal.record_many(indices, path, [self.seconds.pop(i) for i in indices])
+
+    def close(self):
+        self.shards.close()
+
+
+class ShardView:
+    def __init__(self, shards, name, latents, raw_latents):
+        self.shards = shards
+        self.name = name
+        self.latents = latents
+        self.raw_latents = raw_latents
+
+    def __contains__(self, index):
+        return index in self.shards.journal
+
+    def image_path(self, index):
+        """Temporary path of the image, it is moved into the shard once written."""
+        return os.path.join(self.shards.folder, "tmp", f"{self.name}_{int(index):06d}{self.shards.ext}")
+
+    def record(self, index, output_path, render_seconds):
+        self.shards.add(index, self.name, output_path, self.latents, self.raw_latents, render_seconds)
+
+    def close(self):
+        if not self.shards.keep_open:
+            self.shards.close()
+
+
+def encode_png(pixels, level=6):
+    """Encode an (H, W, 3) or (H, W, 4) uint8 image as PNG. Every row uses the
+    Up filter, which compresses the smooth rendered images well and is
+    computed for the whole image at once. zlib releases the GIL, so several
+    images are encoded in parallel by the threads of an AsyncWriter."""
+    height, width, channels = pixels.shape
+    rows = pixels.reshape(height, width * channels)
+    filtered = np.empty((height, width * channels + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, {3: 2, 4: 6}[channels], 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(filtered.tobytes(), level))
+        + chunk(b"IEND", b"")
+    )
+
+
+def encode_webp(pixels):
+    """Encode an image as lossless WebP, needs Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Writing WebP images needs Pillow, install it with pip install pillow")
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="WEBP", lossless=True)
+    return buffer.getvalue()
+
+
+# file extension and encoder of the image formats of an AsyncWriter
+IMAGE_FORMATS = {
+    "png": (".png", encode_png),
+    "webp": (".webp", encode_webp),
+    "npy": (".npy", _npy_bytes),
+}
+
+
+class AsyncWriter:
+    """Encodes and writes images on background threads while the next image
+    is rendered.
+
+    submit blocks while max_pending images are waiting, so a slow file system
+    slows the render loop down instead of filling the memory. Files are written
+    under a temporary name and renamed once complete. The callback of an image
+    is called on the thread calling poll or flush once the file is at its final
+    path, e.g. to record it in the journal of the output.
+    """
+
+    def __init__(self, n_threads=2, max_pending=16, image_format="png"):
+        self.ext, self.encode = IMAGE_FORMATS[image_format]
+        self.todo = queue.Queue(maxsize=max_pending)
+        self.finished = queue.Queue()
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(n_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            job = self.todo.get()
+            if job is None:
+                self.todo.task_done()
+                return
+            path, pixels, callback = job
+            try:
+                tmp = partial_path(path)
+                with open(tmp, "wb") as f:
+                    f.write(self.encode(pixels))
+                os.replace(tmp, path)
+                self.finished.put((callback, None))
+            except Exception as e:
+                self.finished.put((callback, e))
+            self.todo.task_done()
+
+    def submit(self, path, pixels, callback=None):
+        """Queue an (H, W, C) uint8 image to be written to path."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.todo.put((path, pixels, callback))
+
+    def poll(self):
+        """Call the callbacks of the images written so far."""
+        while True:
+            try:
+                callback, error = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            if error is not None:
+                raise error
+            if callback is not None:
+                callback()
+
+    def flush(self):
+        """Wait until all queued images are written and call their callbacks."""
+        self.todo.join()
+        self.poll()
+
+    def close(self):
+        self.flush()
+        for _ in self.threads:
+            self.todo.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact = subparsers.add_parser(
+        "compact", help="merge the journal of an image folder and write its index.json, once all batches stopped"
+    )
+    compact.add_argument("folder", type=str)
+    compact.add_argument("--image-format", default="png", choices=list(IMAGE_FORMATS))
+    compact.add_argument("--fanout", default=None, type=int)
+    args = parser.parse_args()
+
+    journal = RenderJournal(args.folder, ext=IMAGE_FORMATS[args.image_format][0], fanout=args.fanout)
+    journal.compact()
+    print(f"Compacted {len(journal)} samples of {args.folder}")
@@ -0,0 +1,197 @@
+"""Render plans: the Blender parameters of every sample, computed from the latents
+in one vectorised pass and saved next to them as `latents_plan.npy`.
+
+    python render_plan.py build example/m1
+    python render_plan.py show example/m1 0 5
+    python render_plan.py diff example/m1 example/m2
+"""
+
+import os
+import argparse
+import numpy as np
+
+# layout of a latent row, as in generate_clevr_dataset_images.py:
+# spotlight hue, background hue, spotlight position, then the object latents
+# stored factor by factor: hues, alpha angles, beta angles, x, y, z, object types
+SPOT_HUE = 0
+BKG_HUE = 1
+SPOT_POS = 2
+N_SCENE_LATENTS = 3
+N_OBJECT_LATENTS = 7
+
+# saturation and value of the colors
+OBJECT_SV = (1.0, 1.0)
+LIGHT_SV = (0.8, 1.0)
+BACKGROUND_SV = (0.6, 1.0)
+
+# height of the spotlights above the ground, before adding the object size
+LIGHT_HEIGHT = 6.0
+LIGHT_DISTANCE = 4.0
+
+
+def plan_dtype(n_objects):
+    return np.dtype(
+        [
+            ("shape", np.uint8, (n_objects,)),
+            ("location", np.float64, (n_objects, 3)),
+            ("rotation", np.float64, (n_objects, 3)),
+            ("color", np.float64, (n_objects, 4)),
+            ("light_color", np.float64, (3,)),
+            ("light_location", np.float64, (3,)),
+            ("background", np.float64, (4,)),
+        ]
+    )
+
+
+def hsv_to_rgb(h, s, v):
+    """Vectorised colorsys.hsv_to_rgb, returns an array with a last axis of size 3."""
+    h, s, v = np.broadcast_arrays(
+        np.asarray(h, dtype=np.float64), np.asarray(s, dtype=np.float64), np.asarray(v, dtype=np.float64)
+    )
+    # truncation like colorsys, so that negative hues give the same colors
+    i = np.trunc(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(int) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.stack([r, g, b], axis=-1)
+
+
+def hue_to_rgba(hue, saturation, value):
+    """RGBA color of hue latents given in radians."""
+    rgb = hsv_to_rgb(hue / (2.0 * np.pi), saturation, value)
+    return np.concatenate([rgb, np.ones(rgb.shape[:-1] + (1,))], axis=-1)
+
+
+def build_plan(latents):
+    """Compute the render plan of an (N, 3 + 7 * n_objects) latents array, one
+    row per sample. The offsets that depend on the size of the objects in the
+    scene (the objects stand on the ground, the spotlights are above the
+    objects) are added when a row is applied, see update_objects_and_lights."""
+    latents = np.asarray(latents, dtype=np.float64)
+    n_samples = latents.shape[0]
+    n_objects = (latents.shape[1] - N_SCENE_LATENTS) // N_OBJECT_LATENTS
+    # (N, factor, object)
+    objects = latents[:, N_SCENE_LATENTS:].reshape(n_samples, N_OBJECT_LATENTS, n_objects)
+
+    plan = np.zeros(n_samples, dtype=plan_dtype(n_objects))
+    plan["shape"] = objects[:, 6]
+    plan["location"] = objects[:, 3:6].transpose(0, 2, 1)
+    # the third rotation angle is fixed
+    plan["rotation"][..., :2] = objects[:, 1:3].transpose(0, 2, 1)
+    plan["color"] = hue_to_rgba(objects[:, 0], *OBJECT_SV)
+    plan["light_color"] = hsv_to_rgb(latents[:, SPOT_HUE] / (2.0 * np.pi), *LIGHT_SV)
+    plan["light_location"][:, 0] = LIGHT_DISTANCE * np.sin(latents[:, SPOT_POS])
+    plan["light_location"][:, 1] = LIGHT_DISTANCE * np.cos(latents[:, SPOT_POS])
+    plan["light_location"][:, 2] = LIGHT_HEIGHT
+    plan["background"] = hue_to_rgba(latents[:, BKG_HUE], *BACKGROUND_SV)
+    return plan
+
+
+def latents_file(path):
+    """Accept a dataset folder holding latents.npy as well as a latents file."""
+    if os.path.isdir(path):
+        return os.path.join(path, "latents.npy")
+    return path
+
+
+def plan_path(latents_path):
+    root, _ = os.path.splitext(latents_file(latents_path))
+    return f"{root}_plan.npy"
+
+
+def save_plan(path, plan):
+    """Write a plan through a temporary file and a rename, so that batches
+    building the same plan concurrently never read a partial file."""
+    tmp = f"{path}.tmp.{os.getpid()}.npy"
+    np.save(tmp, plan)
+    os.replace(tmp, path)
+
+
+def load_plan(path):
+    """Memory-map a saved plan."""
+    if os.path.isdir(path) or not path.endswith("_plan.npy"):
+        path = plan_path(path)
+    return np.load(path, mmap_mode="r")
+
+
+def load_or_build(latents_path):
+    """Return the memory-mapped plan of a latents file, (re)building it if it
+    is missing, older than the latents or saved with another layout."""
+    latents_path = latents_file(latents_path)
+    path = plan_path(latents_path)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(latents_path):
+        save_plan(path, build_plan(np.load(latents_path, mmap_mode="r")))
+    plan = np.load(path, mmap_mode="r")
+    n_objects = plan.dtype["shape"].shape[0] if "shape" in plan.dtype.names else 0
+    if plan.dtype != plan_dtype(n_objects):
+        # the stored dtype differs from the plan dtype of its number of objects
+        save_plan(path, build_plan(np.load(latents_path, mmap_mode="r")))
+        plan = np.load(path, mmap_mode="r")
+    return plan
+
+
+def diff_plans(a, b, atol=1e-6):
+    """Return {field: indices of the rows that differ} of two plans."""
+    if a.dtype != b.dtype or len(a) != len(b):
+        raise ValueError(f"Plans of {len(a)} and {len(b)} rows with different layouts cannot be compared")
+    diff = {}
+    for field in a.dtype.names:
+        x, y = a[field], b[field]
+        if x.dtype.kind == "f":
+            differs = ~np.isclose(x, y, atol=atol, rtol=0.0)
+        else:
+            differs = x != y
+        rows = np.flatnonzero(differs.reshape(len(a), -1).any(axis=1))
+        if len(rows):
+            diff[field] = rows
+    return diff
+
+
+def format_row(row):
+    lines = []
+    for field in row.dtype.names:
+        value = row[field]
+        if np.asarray(value).dtype.kind == "f":
+            value = np.round(value, 4).tolist()
+        elif isinstance(value, np.ndarray):
+            value = value.tolist()
+        lines.append(f"  {field:<15}{value}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build the plan of a latents file or folder")
+    build.add_argument("latents", type=str)
+    show = subparsers.add_parser("show", help="print rows [start, stop) of a plan")
+    show.add_argument("plan", type=str)
+    show.add_argument("start", type=int, nargs="?", default=0)
+    show.add_argument("stop", type=int, nargs="?", default=None)
+    diff = subparsers.add_parser("diff", help="compare two plans")
+    diff.add_argument("a", type=str)
+    diff.add_argument("b", type=str)
+    diff.add_argument("--atol", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        plan = build_plan(np.load(latents_file(args.latents), mmap_mode="r"))
+        save_plan(plan_path(args.latents), plan)
+        print(f"Wrote {len(plan)} rows to {plan_path(args.latents)}")
+    elif args.command == "show":
+        plan = load_plan(args.plan)
+        stop = args.start + 1 if args.stop is None else args.stop
+        for i in range(args.start, min(stop, len(plan))):
+            print(f"{i}:")
+            print(format_row(plan[i]))
+    else:
+        diff = diff_plans(load_plan(args.a), load_plan(args.b), args.atol)
+        if not diff:
+            print("Plans are identical")
+        for field, rows in diff.items():
+            print(f"{field}: {len(rows)} rows differ, e.g. {rows[:10].tolist()}")
@@ -0,0 +1,188 @@
+"""Spool directory used to hand render jobs to long-lived Blender workers.
+
+    python render_queue.py --spool spool --latents example/m1 --n-samples 1000 --chunk-size 50
+"""
+
+import os
+import json
+import time
+import glob
+import argparse
+
+# jobs move between the sub-folders of the spool directory with atomic renames,
+# so several workers can poll the same spool without further locking:
+#   pending/  jobs waiting for a worker
+#   claimed/  jobs being rendered, prefixed with the id of their worker
+#   done/     finished jobs
+#   workers/  per-worker statistics
+SUBFOLDERS = ("pending", "claimed", "done", "workers")
+
+
+def init_spool(spool_dir):
+    for name in SUBFOLDERS:
+        os.makedirs(os.path.join(spool_dir, name), exist_ok=True)
+
+
+def _write_json(path, content):
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(content, f, indent=1)
+    os.replace(tmp, path)
+
+
+def submit_job(spool_dir, latents, start, stop, material_names=None, output_folder=None):
+    """Add a job rendering samples [start, stop) of the given latents to the spool.
+    A job is a small json file, e.g.
+        {"latents": ".../m1/latents.npy", "start": 0, "stop": 100,
+         "material_names": ["Rubber"], "output_folder": ".../m1"}
+    """
+    init_spool(spool_dir)
+    if os.path.isdir(latents):
+        latents = os.path.join(latents, "latents.npy")
+    latents = os.path.abspath(latents)
+    job = {
+        "latents": latents,
+        "start": int(start),
+        "stop": int(stop),
+        "material_names": material_names,
+        "output_folder": os.path.abspath(output_folder or os.path.dirname(latents)),
+        "submitted": time.time(),
+    }
+    name = f"{time.time_ns()}_{int(start):09d}_{int(stop):09d}.json"
+    path = os.path.join(spool_dir, "pending", name)
+    _write_json(path, job)
+    return path
+
+
+def submit_range(spool_dir, latents, n_samples, chunk_size, **kwargs):
+    """Split samples [0, n_samples) into jobs of chunk_size samples."""
+    return [
+        submit_job(spool_dir, latents, start, min(start + chunk_size, n_samples), **kwargs)
+        for start in range(0, n_samples, chunk_size)
+    ]
+
+
+def claim_job(spool_dir, worker):
+    """Claim the oldest pending job. Returns (claimed path, job) or None if the
+    spool is empty."""
+    for path in sorted(glob.glob(os.path.join(spool_dir, "pending", "*.json"))):
+        claimed = os.path.join(spool_dir, "claimed", f"{worker}__{os.path.basename(path)}")
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            # another worker was faster
+            continue
+        with open(claimed) as f:
+            return claimed, json.load(f)
+    return None
+
+
+def finish_job(spool_dir, claimed):
+    """Move a claimed job to done/."""
+    name = os.path.basename(claimed).split("__", 1)[1]
+    os.replace(claimed, os.path.join(spool_dir, "done", name))
+
+
+def renew_lease(claimed):
+    """Heartbeat of the worker holding a job; the lease age is the file's mtime."""
+    os.utime(claimed)
+
+
+def requeue_job(spool_dir, claimed):
+    """Hand a claimed job back to pending/, e.g. because its worker died."""
+    name = os.path.basename(claimed).split("__", 1)[1]
+    try:
+        os.replace(claimed, os.path.join(spool_dir, "pending", name))
+    except FileNotFoundError:
+        # finished in the meantime
+        pass
+
+
+def list_claimed(spool_dir):
+    """Return (claimed path, worker id, lease age in seconds) of all claimed jobs."""
+    leases = []
+    now = time.time()
+    for path in glob.glob(os.path.join(spool_dir, "claimed", "*.json")):
+        try:
+            age = now - os.path.getmtime(path)
+        except FileNotFoundError:
+            continue
+        leases.append((path, os.path.basename(path).split("__", 1)[0], age))
+    return leases
+
+
+def count_jobs(spool_dir, state="pending"):
+    return len(glob.glob(os.path.join(spool_dir, state, "*.json")))
+
+
+def load_worker_stats(spool_dir):
+    stats = []
+    for path in sorted(glob.glob(os.path.join(spool_dir, "workers", "*.json"))):
+        with open(path) as f:
+            stats.append(json.load(f))
+    return stats
+
+
+class WorkerStats:
+    """Throughput and idle time of a worker."""
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.started = time.time()
+        self.jobs = 0
+        self.samples = 0
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+
+    def job_done(self, n_samples, seconds):
+        self.jobs += 1
+        self.samples += int(n_samples)
+        self.busy_seconds += seconds
+
+    def idle(self, seconds):
+        self.idle_seconds += seconds
+
+    def as_dict(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            "worker": self.worker,
+            "jobs": self.jobs,
+            "samples": self.samples,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "idle_seconds": round(self.idle_seconds, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "jobs_per_second": self.jobs / elapsed,
+            "samples_per_second": self.samples / elapsed,
+        }
+
+    def save(self, spool_dir):
+        _write_json(os.path.join(spool_dir, "workers", f"{self.worker}.json"), self.as_dict())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spool", required=True, type=str)
+    parser.add_argument("--latents", required=True, type=str)
+    parser.add_argument("--n-samples", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--material-names", nargs="+", type=str)
+    parser.add_argument("--output-folder", type=str, default=None)
+    args = parser.parse_args()
+
+    n_samples = args.n_samples
+    if n_samples is None:
+        import numpy as np
+        latents = args.latents
+        if os.path.isdir(latents):
+            latents = os.path.join(latents, "latents.npy")
+        n_samples = np.load(latents, mmap_mode="r").shape[0]
+
+    jobs = submit_range(
+        args.spool,
+        args.latents,
+        n_samples,
+        args.chunk_size,
+        material_names=args.material_names,
+        output_folder=args.output_folder,
+    )
+    print(f"Submitted {len(jobs)} jobs to {args.spool}")
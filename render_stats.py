@@ -0,0 +1,151 @@
+"""Timing and image quality statistics of the render loop.
+
+    python render_stats.py timings.jsonl
+"""
+
+import sys
+import json
+import time
+import contextlib
+import numpy as np
+
+
+class StageTimer:
+    """Measures the wall clock time spent in each stage of the render loop.
+
+    Stages are timed with `with timer.stage(name):` and attributed to the
+    current sample until `sample_done` writes them as one JSON line. Nested
+    stages are not counted in the time of their parent stage, so the stages of
+    a sample add up to its total time. When no log path is given the timer only
+    keeps the per-batch summary; a disabled timer does nothing at all.
+    """
+
+    def __init__(self, path=None, enabled=True):
+        self.enabled = enabled
+        self.file = None
+        self.samples = []
+        self.current = {}
+        self._nested = [0.0]
+        if path is not None:
+            self.open(path)
+
+    def open(self, path):
+        """Enable the timer and append the per-sample timings to path."""
+        self.enabled = True
+        self.file = open(path, "a", buffering=1)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            self._nested[-1] += elapsed
+            self.current[name] = self.current.get(name, 0.0) + elapsed - nested
+
+    def sample_done(self, index, **extra):
+        """Close the timings of a sample."""
+        if not self.enabled:
+            return
+        record = {"index": int(index), "time": time.time(), **extra, "stages": self.current}
+        self.samples.append(self.current)
+        self.current = {}
+        if self.file is not None:
+            self.file.write(json.dumps(record) + "\n")
+
+    def reset(self):
+        self.samples = []
+        self.current = {}
+
+    def summary(self):
+        """Count, total, mean, p50 and p95 in seconds of every stage."""
+        return summarize(self.samples)
+
+    def print_summary(self):
+        if not self.enabled or not self.samples:
+            return
+        print_summary(self.summary())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def summarize(samples):
+    """Summarize a list of {stage: seconds} dicts."""
+    stages = {}
+    for sample in samples:
+        for name, seconds in sample.items():
+            stages.setdefault(name, []).append(seconds)
+    summary = {}
+    for name, values in stages.items():
+        values = np.asarray(values)
+        summary[name] = {
+            "count": len(values),
+            "total": float(values.sum()),
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+        }
+    return summary
+
+
+def print_summary(summary):
+    total = sum(s["total"] for s in summary.values())
+    print(f"{'stage':<28}{'count':>8}{'total [s]':>12}{'share':>8}{'p50 [s]':>10}{'p95 [s]':>10}")
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+        print(
+            f"{name:<28}{s['count']:>8}{s['total']:>12.2f}{100 * s['total'] / max(total, 1e-9):>7.1f}%"
+            f"{s['p50']:>10.3f}{s['p95']:>10.3f}"
+        )
+
+
+def psnr(image, reference):
+    """Peak signal-to-noise ratio in dB between two uint8 images."""
+    mse = np.mean((image.astype(np.float64) - reference.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10.0 * np.log10(255.0 ** 2 / mse))
+
+
+def _box_filter(x, size):
+    """Mean over size x size windows (valid part only) of a (H, W, ...) array."""
+    c = np.cumsum(np.cumsum(x, axis=0), axis=1)
+    c = np.pad(c, [(1, 0), (1, 0)] + [(0, 0)] * (x.ndim - 2))
+    window = c[size:, size:] - c[:-size, size:] - c[size:, :-size] + c[:-size, :-size]
+    return window / size ** 2
+
+
+def ssim(image, reference, window=7):
+    """Structural similarity between two uint8 images, computed over
+    window x window patches and averaged over patches and channels."""
+    x = image.astype(np.float64)
+    y = reference.astype(np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    mx = _box_filter(x, window)
+    my = _box_filter(y, window)
+    sxx = _box_filter(x * x, window) - mx ** 2
+    syy = _box_filter(y * y, window) - my ** 2
+    sxy = _box_filter(x * y, window) - mx * my
+    s = ((2 * mx * my + c1) * (2 * sxy + c2)) / ((mx ** 2 + my ** 2 + c1) * (sxx + syy + c2))
+    return float(s.mean())
+
+
+def load_timings(path):
+    with open(path) as f:
+        return [json.loads(line)["stages"] for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    samples = []
+    for path in sys.argv[1:]:
+        samples.extend(load_timings(path))
+    print_summary(summarize(samples))
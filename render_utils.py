@@ -9,6 +9,7 @@
 # of patent rights can be found in the ORIGINAL_PATENTS file in the same directory.
 
 import sys, random, os, json
+import numpy as np
 import bpy, bpy_extras
 
 
@@ -83,42 +84,65 @@ def set_layer(obj, layer_idx):
         obj.layers[i] = i == layer_idx
 
 
+# mesh datablocks of the shapes loaded by load_shape, by shape name
+SHAPE_MESHES = {}
+
+
+def load_shape(object_dir, shape_name):
+    """
+    Return the mesh of the object "$name" stored in "$name.blend", loading it
+    with bpy.data.libraries.load the first time the shape is used. The mesh is
+    kept with a fake user and is shared by all objects of this shape. Opening
+    another .blend file frees it, in which case it is loaded again.
+    """
+    mesh = bpy.data.meshes.get(SHAPE_MESHES.get(shape_name, ""))
+    if mesh is not None and mesh.get("shape_asset") == shape_name:
+        return mesh
+
+    filepath = os.path.join(object_dir, "%s.blend" % shape_name)
+    with bpy.data.libraries.load(filepath) as (data_from, data_to):
+        data_to.objects = [shape_name]
+    template = data_to.objects[0]
+    mesh = template.data
+    bpy.data.objects.remove(template, do_unlink=True)
+
+    # the materials are set per object, see add_material
+    mesh.materials.clear()
+    mesh.materials.append(None)
+    mesh.use_fake_user = True
+    mesh["shape_asset"] = shape_name
+    SHAPE_MESHES[shape_name] = mesh.name
+    return mesh
+
+
 def add_object(
     object_dir, shape_name, name, scale, loc=(0, 0, 0), alpha=0, beta=0, gamma=0
 ):
     """
-    Load an object from a file. We assume that in the directory object_dir, there
+    Add an object to the scene. We assume that in the directory object_dir, there
     is a file named "$name.blend" which contains a single object named "$name"
-    that has unit size and is centered at the origin.
+    that has unit size and is centered at the origin. All objects of a shape are
+    instances sharing the mesh loaded once by load_shape.
 
     - scale: scalar giving the size that the object should be in the scene
     - loc: tuple (x, y, z) giving the coordinates where the object should be placed.
     """
-    # First figure out how many of this object are already in the scene so we can
-    # give the new object a unique name
-    count = 0
-    for obj in bpy.data.objects:
-        if obj.name.startswith(shape_name):
-            count += 1
+    mesh = load_shape(object_dir, shape_name)
 
-    filename = os.path.join(object_dir, "%s.blend" % shape_name, "Object", shape_name)
-    bpy.ops.wm.append(filename=filename)
+    # Give it a new name to avoid conflicts, the mesh has one user per object
+    # of this shape besides its fake user
+    new_name = "%s_%d_%s" % (shape_name, mesh.users - 1, name)
+    obj = bpy.data.objects.new(new_name, mesh)
+    bpy.context.collection.objects.link(obj)
 
-    # Give it a new name to avoid conflicts
-    new_name = "%s_%d_%s" % (shape_name, count, name)
-    bpy.data.objects[shape_name].name = new_name
-
-    # Set the new object as active, then rotate, scale, and translate it
+    # Rotate, scale, and translate it
     x, y, z = loc
-    bpy.context.view_layer.objects.active = bpy.data.objects[new_name]
-    bpy.data.objects[new_name].select_set(True)
-    bpy.context.object.rotation_euler[0] = alpha
-    bpy.context.object.rotation_euler[1] = beta
-    bpy.context.object.rotation_euler[2] = gamma
-    bpy.ops.transform.resize(value=(scale, scale, scale))
-    bpy.ops.transform.translate(value=(x, y, scale + z))
+    obj.rotation_euler = (alpha, beta, gamma)
+    obj.scale = (scale, scale, scale)
+    obj.location = (x, y, scale + z)
+    bpy.context.view_layer.objects.active = obj
 
-    return new_name
+    return obj.name
 
 
 def load_materials(material_dir):
@@ -135,14 +159,30 @@ def load_materials(material_dir):
         bpy.ops.wm.append(filename=filepath)
 
 
-def change_material(material, **properties):
-    """Update the parameters of a material"""
+def change_material(material, frame=None, **properties):
+    """Update the parameters of a material, keyframing them on frame if given"""
     group_node = material.node_tree.nodes[-1]
 
     # Find and set the "Color" input of the new group node
     for inp in group_node.inputs:
         if inp.name in properties:
             inp.default_value = properties[inp.name]
+            if frame is not None:
+                inp.keyframe_insert("default_value", frame=frame)
+
+
+def swap_material(material, name):
+    """
+    Replace the node group of a material created with add_material by the
+    previously loaded node group "name". The material stays assigned to its
+    object, only its shading changes.
+    """
+    group_node = material.node_tree.nodes[-1]
+    group_node.node_tree = bpy.data.node_groups[name]
+    material.node_tree.links.new(
+        group_node.outputs["Shader"],
+        material.node_tree.nodes["Material Output"].inputs["Surface"],
+    )
 
 
 def add_material(name, object=None, **properties):
@@ -164,15 +204,19 @@ def add_material(name, object=None, **properties):
     mat.name = "Material_%d" % mat_count
 
     # Attach the new material to the active object
-    # Make sure it doesn't already have materials
     if object is None:
         print("Using selected object")
         obj = bpy.context.active_object
     else:
         obj = object
 
-    assert len(obj.data.materials) == 0
-    obj.data.materials.append(mat)
+    # Objects of the same shape share their mesh, so the material is linked to
+    # the object instead of the mesh
+    if len(obj.material_slots) == 0:
+        obj.data.materials.append(None)
+    slot = obj.material_slots[-1]
+    slot.link = "OBJECT"
+    slot.material = mat
 
     # Find the output node of the new material
     output_node = None
@@ -224,6 +268,114 @@ def add_texture(obj_name, path):
     o.data.materials.append(mat)
 
 
+def enable_viewer_output():
+    """
+    Route the render result to a compositor Viewer node. In background mode the
+    pixels of the "Render Result" image cannot be read, those of the
+    "Viewer Node" image can.
+    """
+    scene = bpy.context.scene
+    scene.use_nodes = True
+    scene.render.use_compositing = True
+    tree = scene.node_tree
+    layers = None
+    viewer = None
+    for node in tree.nodes:
+        if node.type == "R_LAYERS":
+            layers = node
+        elif node.type == "VIEWER":
+            viewer = node
+    if layers is None:
+        layers = tree.nodes.new("CompositorNodeRLayers")
+    if viewer is None:
+        viewer = tree.nodes.new("CompositorNodeViewer")
+    viewer.use_alpha = False
+    tree.links.new(layers.outputs["Image"], viewer.inputs["Image"])
+
+
+def read_viewer_pixels():
+    """
+    Return the pixels of the last render as a (height, width, 4) float32 array
+    of linear RGBA values, first row at the top. Requires enable_viewer_output.
+    """
+    image = bpy.data.images["Viewer Node"]
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    return pixels.reshape(height, width, 4)[::-1]
+
+
+# file output slot name and render layer output of each pass
+PASSES = {"index": "IndexOB", "depth": "Depth", "normal": "Normal"}
+
+
+def enable_passes(output_dir):
+    """
+    Enable the object index, depth and normal passes and write them with a
+    compositor File Output node as 32 bit EXR files into output_dir. The passes
+    come from the same render as the image, no second render is needed.
+    """
+    scene = bpy.context.scene
+    view_layer = bpy.context.view_layer
+    view_layer.use_pass_object_index = True
+    view_layer.use_pass_z = True
+    view_layer.use_pass_normal = True
+
+    scene.use_nodes = True
+    scene.render.use_compositing = True
+    tree = scene.node_tree
+    layers = None
+    for node in tree.nodes:
+        if node.type == "R_LAYERS":
+            layers = node
+    if layers is None:
+        layers = tree.nodes.new("CompositorNodeRLayers")
+
+    output = tree.nodes.new("CompositorNodeOutputFile")
+    output.name = "Passes"
+    output.base_path = output_dir
+    output.format.file_format = "OPEN_EXR"
+    output.format.color_depth = "32"
+    output.file_slots.clear()
+    for name, socket in PASSES.items():
+        if socket not in layers.outputs:
+            # older Blender versions call the depth pass Z
+            socket = "Z"
+        output.file_slots.new(name)
+        tree.links.new(layers.outputs[socket], output.inputs[name])
+
+
+def set_passes_dir(output_dir):
+    """Change the folder the passes enabled by enable_passes are written to,
+    e.g. after opening a saved scene."""
+    bpy.context.scene.node_tree.nodes["Passes"].base_path = output_dir
+
+
+def read_passes(output_dir, frame):
+    """
+    Load the passes written by enable_passes for the given frame and remove
+    their files. Returns a dict of compact arrays, first row at the top:
+    - mask: (height, width) uint8 object index, 0 for the background
+    - depth: (height, width) float16 distance to the camera
+    - normal: (height, width, 3) float16 world space normals
+    """
+    pixels = {}
+    for name in PASSES:
+        path = os.path.join(output_dir, "%s%04d.exr" % (name, frame))
+        image = bpy.data.images.load(path)
+        width, height = image.size
+        values = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(values)
+        bpy.data.images.remove(image)
+        os.remove(path)
+        pixels[name] = values.reshape(height, width, 4)[::-1]
+    return {
+        "mask": np.round(pixels["index"][..., 0]).astype(np.uint8),
+        "depth": np.minimum(pixels["depth"][..., 0], np.finfo(np.float16).max).astype(np.float16),
+        "normal": pixels["normal"][..., :3].astype(np.float16),
+    }
+
+
 def render_segmentation(objects, segm_mat, segm_color, render_args):
     ground_modified = len(bpy.data.objects["Ground"].data.materials) > 0
     n_obj = len(objects)
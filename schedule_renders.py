@@ -0,0 +1,232 @@
+"""Render a dataset with a pool of local Blender workers.
+
+Instead of splitting the samples statically with --n-batches/--batch-index,
+the samples are cut into small jobs that are put into a spool directory (see
+render_queue.py). N Blender workers started in daemon mode pull the jobs as
+they become free, so slow samples (e.g. crystal materials, many objects) do
+not leave the other workers idle at the end of the run. Jobs held by a worker
+that died, or whose lease was not renewed for --lease-timeout seconds, are
+handed out again. A per-worker utilisation summary is written at the end.
+
+A single worker is started by default. With --workers N > 1, every worker
+renders with its share of the cores (--threads cpu_count // N) unless
+--threads is forwarded explicitly, as Cycles would otherwise start one thread
+per core in every worker.
+
+If a render_tuning.json written by tune_render.py exists, its number of
+workers, Cycles threads and tile size are used unless given explicitly.
+Workers with a fixed number of threads are pinned to their own block of cores.
+
+python schedule_renders.py --blender ${BLENDER_DIR} --latents example/m1 --material-names Rubber --workers 8 --chunk-size 20 -- --use-gpu
+"""
+
+import os
+import json
+import time
+import argparse
+import subprocess
+import render_io
+import render_queue
+import tune_render
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_clevr_dataset_images.py")
+# each worker holds its own copy of the scene, start one unless asked for more
+DEFAULT_WORKERS = 1
+
+
+def start_worker(args, worker, cores=None):
+    command = [
+        args.blender,
+        "-noaudio",
+        "--background",
+        "--python",
+        SCRIPT,
+        "--daemon-spool",
+        os.path.abspath(args.spool),
+        "--exit-when-empty",
+        "--worker-id",
+        worker,
+    ] + args.worker_args
+    log = open(os.path.join(args.spool, "workers", f"{worker}.log"), "w")
+    print("Starting", worker)
+    return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, preexec_fn=tune_render.pin_to(cores))
+
+
+def reissue_leases(args, workers):
+    """Hand back the jobs of dead workers and of workers whose lease expired."""
+    n_reissued = 0
+    for path, worker, age in render_queue.list_claimed(args.spool):
+        process = workers.get(worker)
+        dead = process is not None and process.poll() is not None
+        expired = age > args.lease_timeout
+        if not (dead or expired):
+            continue
+        if expired and process is not None and process.poll() is None:
+            # hanging worker, it would otherwise keep rendering the job
+            process.kill()
+        print(f"Re-issuing {os.path.basename(path)} held by {worker}")
+        render_queue.requeue_job(args.spool, path)
+        n_reissued += 1
+    return n_reissued
+
+
+def summarize(args, workers, n_reissued, elapsed):
+    """Write and print the utilisation of every worker."""
+    stats = [s for s in render_queue.load_worker_stats(args.spool) if s["worker"] in workers]
+    for s in stats:
+        s["utilisation"] = s["busy_seconds"] / max(s["elapsed_seconds"], 1e-9)
+    summary = {
+        "elapsed_seconds": round(elapsed, 3),
+        "samples": sum(s["samples"] for s in stats),
+        "reissued_jobs": n_reissued,
+        "workers": stats,
+    }
+    with open(os.path.join(args.spool, "utilisation.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+
+    print(f"Rendered {summary['samples']} samples in {elapsed:.1f}s, {n_reissued} jobs re-issued")
+    for s in stats:
+        print(
+            f"{s['worker']}: {s['jobs']} jobs, {s['samples']} samples, "
+            f"{100 * s['utilisation']:.1f}% busy, {s['idle_seconds']:.1f}s idle"
+        )
+    return summary
+
+
+def compact_journals(args):
+    """Merge the journal segments of every output folder once all workers stopped,
+    and write its index.json. Shard and memmap outputs keep no journal of image
+    files, see open_outputs."""
+    if worker_option(args.worker_args, "--output-format", "png") in ("shards", "memmap"):
+        return
+    image_format = worker_option(args.worker_args, "--image-format", "png")
+    fanout = worker_option(args.worker_args, "--fanout", None)
+    folders = set()
+    for name in os.listdir(os.path.join(args.spool, "done")):
+        with open(os.path.join(args.spool, "done", name)) as f:
+            folders.add(json.load(f)["output_folder"])
+    for folder in folders:
+        folder = os.path.join(folder, "images")
+        if not os.path.isdir(os.path.join(folder, "journal")):
+            continue
+        render_io.RenderJournal(
+            folder, ext=render_io.IMAGE_FORMATS[image_format][0], fanout=fanout and int(fanout)
+        ).compact()
+
+
+def worker_option(worker_args, name, default):
+    """The value of an option forwarded to the workers, or default if not given."""
+    if name not in worker_args:
+        return default
+    return worker_args[worker_args.index(name) + 1]
+
+
+def apply_tuning(args):
+    """Fill in the settings not given on the command line from the tuning file,
+    falling back to DEFAULT_WORKERS workers without one."""
+    tuning = tune_render.load_tuning(args.tuning)
+    if tuning is None:
+        if args.workers is None:
+            args.workers = DEFAULT_WORKERS
+        return
+    if args.workers is None:
+        args.workers = tuning["processes"]
+    # 0 threads (all cores) is left to share_cores, which splits them if there are several workers
+    if "--threads" not in args.worker_args and tuning["threads"] > 0:
+        args.worker_args += ["--threads", str(tuning["threads"])]
+    if "--tile-size" not in args.worker_args:
+        args.worker_args += ["--tile-size", str(tuning["tile_size"])]
+    print(f"Using {args.tuning}: {args.workers} workers, {' '.join(args.worker_args)}")
+
+
+def share_cores(args):
+    """Split the cores between the workers when their number of Cycles threads
+    is not given, instead of every worker using all of them."""
+    if args.workers > 1 and "--threads" not in args.worker_args:
+        n_cores = len(os.sched_getaffinity(0))
+        args.worker_args += ["--threads", str(max(1, n_cores // args.workers))]
+
+
+def worker_cores(args):
+    """Return the cores of every worker slot, or None if workers are not pinned."""
+    if "--threads" not in args.worker_args:
+        return None
+    threads = int(args.worker_args[args.worker_args.index("--threads") + 1])
+    return tune_render.core_sets(args.workers, threads)
+
+
+def main(args):
+    render_queue.init_spool(args.spool)
+    apply_tuning(args)
+    share_cores(args)
+    cores = worker_cores(args)
+    if args.latents is not None:
+        latents = args.latents
+        if os.path.isdir(latents):
+            latents = os.path.join(latents, "latents.npy")
+        n_samples = args.n_samples
+        if n_samples is None:
+            import numpy as np
+            n_samples = np.load(latents, mmap_mode="r").shape[0]
+        jobs = render_queue.submit_range(
+            args.spool,
+            latents,
+            n_samples,
+            args.chunk_size,
+            material_names=args.material_names,
+            output_folder=args.output_folder,
+        )
+        print(f"Submitted {len(jobs)} jobs")
+
+    start = time.time()
+    workers = {}
+    slots = {}
+    n_reissued = 0
+    n_started = 0
+    while True:
+        n_reissued += reissue_leases(args, workers)
+        n_pending = render_queue.count_jobs(args.spool, "pending")
+        n_claimed = render_queue.count_jobs(args.spool, "claimed")
+        alive = [w for w, p in workers.items() if p.poll() is None]
+        if n_pending == 0 and n_claimed == 0:
+            break
+
+        # keep the pool full as long as there is work left
+        while n_pending > 0 and len(alive) < args.workers:
+            if n_started >= args.workers + args.max_restarts:
+                raise RuntimeError("Workers keep failing, see the logs in the spool directory")
+            worker = f"{args.prefix}{n_started:03d}"
+            # a restarted worker takes over the cores of the one it replaces
+            slots[worker] = min(set(range(args.workers)) - {slots[w] for w in alive})
+            workers[worker] = start_worker(args, worker, cores and cores[slots[worker]])
+            alive.append(worker)
+            n_started += 1
+
+        time.sleep(args.poll_interval)
+
+    for process in workers.values():
+        process.wait()
+    compact_journals(args)
+    return summarize(args, workers, n_reissued, time.time() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blender", default="blender", type=str)
+    parser.add_argument("--spool", default="spool", type=str)
+    parser.add_argument("--latents", type=str, default=None)
+    parser.add_argument("--n-samples", type=int, default=None)
+    parser.add_argument("--output-folder", type=str, default=None)
+    parser.add_argument("--material-names", nargs="+", type=str)
+    parser.add_argument("--workers", default=None, type=int)
+    parser.add_argument("--tuning", default="render_tuning.json", type=str)
+    parser.add_argument("--chunk-size", default=20, type=int)
+    parser.add_argument("--lease-timeout", default=1800.0, type=float)
+    parser.add_argument("--poll-interval", default=2.0, type=float)
+    parser.add_argument("--max-restarts", default=10, type=int)
+    parser.add_argument("--prefix", default=f"{os.uname().nodename}-w", type=str)
+    parser.add_argument("worker_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.worker_args[:1] == ["--"]:
+        args.worker_args = args.worker_args[1:]
+    main(args)
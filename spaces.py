@@ -5,7 +5,7 @@ import torch
 import numpy as np
 import vmf
 import spaces_utils as sut
-from scipy.stats import wishart, truncnorm
+from scipy.stats import wishart
 
 
 class Space(ABC):
@@ -271,23 +271,26 @@ class NBoxSpace(Space):
     def dim(self):
         return self.n
 
-    def delta(self, size, device="cpu"):
-        return (0.0*torch.rand(size=(size, self.n), device=device))
+    def delta(self, size, device="cpu", rng=None):
+        return torch.zeros((size, self.n), device=device)
 
-    def uniform(self, size, device="cpu"):
-        return (
-            torch.rand(size=(size, self.n), device=device) * (self.max_ - self.min_)
-            + self.min_
-        )
+    def uniform(self, size, device="cpu", rng=None):
+        if rng is not None:
+            values = rng.rand(self.n, device=device)
+        else:
+            values = torch.rand(size=(size, self.n), device=device)
+        return values * (self.max_ - self.min_) + self.min_
 
-    def normal(self, mean, std, size, device="cpu"):
-        """Sample from a Normal distribution in R^N and then restrict the samples to a box.
+    def normal(self, mean, std, size, device="cpu", rng=None):
+        """Sample from a Normal distribution in R^N truncated to the box, by
+        inverting its CDF (see spaces_utils.truncated_normal).
 
         Args:
             mean: Value(s) to sample around.
             std: Concentration parameter of the distribution (=standard deviation).
             size: Number of samples to draw.
             device: torch device identifier
+            rng: Optional spaces_utils.CounterRNG of the samples.
         """
 
         assert len(mean.shape) == 1 or (len(mean.shape) == 2 and len(mean) == size)
@@ -297,21 +300,54 @@ class NBoxSpace(Space):
 
         mean = mean.to(device)
 
-        sampler = lambda s: torch.randn((s, self.n), device=device) * std + mean
-        values = sut.truncated_rejection_resampling(
-            sampler, self.min_, self.max_, size, self.n, device=device
+        values = sut.truncated_normal(
+            mean, std, self.min_, self.max_, size, self.n, device=device, rng=rng
         )
 
         return values.view((size, self.n))
+
+    def normal_rejection(self, mean, std, size, device="cpu", rng=None):
+        """Reference implementation of normal by rejection sampling, whose cost
+        grows as the mass of the box shrinks, e.g. for means close to its edges.
+
+        Args:
+            mean: Value(s) to sample around.
+            std: Concentration parameter of the distribution (=standard deviation).
+            size: Number of samples to draw.
+            device: torch device identifier
+            rng: Optional spaces_utils.CounterRNG of the samples.
+        """
+
+        assert len(mean.shape) == 1 or (len(mean.shape) == 2 and len(mean) == size)
+
+        if len(mean.shape) == 1:
+            mean = mean.unsqueeze(-1)
+
+        mean = mean.to(device)
+
+        if rng is not None:
+            mean = mean.expand(size, self.n)
+            sampler = lambda rows, draw: rng.select(rows).randn(self.n, draw, device) * std + mean[rows]
+            values = sut.truncated_counter_resampling(
+                sampler, self.min_, self.max_, size, self.n, device=device
+            )
+        else:
+            sampler = lambda s: torch.randn((s, self.n), device=device) * std + mean
+            values = sut.truncated_rejection_resampling(
+                sampler, self.min_, self.max_, size, self.n, device=device
+            )
+
+        return values.view((size, self.n))
     
-    def trunc_normal(self, mean, std, size, device="cpu", change_prob=1., statistical_dependence=False):
-        """Sample from a Normal distribution in R^N and then restrict the samples to a box.
+    def trunc_normal(self, mean, std, size, device="cpu", change_prob=1., statistical_dependence=False, rng=None):
+        """Sample from a Normal distribution in R^N truncated to the box.
 
         Args:
             mean: Value(s) to sample around.
             std: Concentration parameter of the distribution (=standard deviation).
             size: Number of samples to draw.
             device: torch device identifier
+            rng: Optional spaces_utils.CounterRNG of the samples.
         """
 
         assert len(mean.shape) == 1 or (len(mean.shape) == 2 and len(mean) == size)
@@ -322,13 +358,35 @@ class NBoxSpace(Space):
             mean = mean.unsqueeze(0)
 
         mean = mean.to(device)
-        mean_np = mean.detach().cpu().numpy()
-        a = (self.min_ - mean_np) / std
-        b = (self.max_ - mean_np) / std
-        unnormalised_samples = truncnorm.rvs(a, b, size=(size, self.n))
-        print(std,mean_np)
-        samples = torch.FloatTensor(std * unnormalised_samples + mean_np, device=device)
-        return samples
+
+        return sut.truncated_normal(mean, std, self.min_, self.max_, size, self.n, device=device, rng=rng)
+
+    def trunc_uniform(self, mean, a, b, size, device="cpu", rng=None):
+        """Sample uniformly from [mean + a, mean + b] restricted to the box.
+
+        Args:
+            mean: Value(s) to sample around.
+            a: Lower offset from the mean.
+            b: Upper offset from the mean.
+            size: Number of samples to draw.
+            device: torch device identifier
+            rng: Optional spaces_utils.CounterRNG of the samples.
+        """
+
+        assert len(mean.shape) == 1 or (len(mean.shape) == 2 and len(mean) == size)
+
+        if len(mean.shape) == 1:
+            mean = mean.unsqueeze(-1)
+
+        mean = mean.to(device)
+        low = torch.clamp(mean + a, self.min_, self.max_)
+        high = torch.clamp(mean + b, self.min_, self.max_)
+        if rng is not None:
+            values = rng.rand(self.n, device=device)
+        else:
+            values = torch.rand((size, self.n), device=device)
+
+        return low + (high - low) * values
 
     def laplace(self, mean, lbd, size, device="cpu"):
         """Sample from a Laplace distribution in R^N and then restrict the samples to a box.
@@ -355,17 +413,25 @@ class NBoxSpace(Space):
 
         return values.view((size, self.n))
     
-    def multinomial(self, mean, classes, size, weights=None, uniform=True, device=None):
+    def multinomial(self, mean, classes, size, weights=None, uniform=True, device=None, rng=None):
 
         if uniform:
             weights = (1/classes)*torch.ones([classes])
         else: assert weights != None, "Provide weights for object distribution"
         
-        changes = torch.reshape(
-                    torch.multinomial(weights, size * 1, replacement=True),
-                    [size,],
-                )
-        return (mean + changes).unsqueeze(-1)
+        if len(mean.shape) == 1:
+            mean = mean.unsqueeze(-1)
+
+        if rng is not None:
+            cdf = np.cumsum(np.asarray(weights, dtype=np.float64))
+            changes = np.searchsorted(cdf / cdf[-1], rng.random(self.n), side="right")
+            changes = torch.as_tensor(np.minimum(changes, classes - 1))
+        else:
+            changes = torch.reshape(
+                        torch.multinomial(weights, size * self.n, replacement=True),
+                        [size, self.n],
+                    )
+        return mean + changes
 
 
     def generalized_normal(self, mean, lbd, p, size, device=None):
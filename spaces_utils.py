@@ -103,6 +103,48 @@ def sample_generalized_normal(mean: torch.Tensor, lbd: float, p: int, shape):
     return mean + lbd * sampled.to(mean.device)
 
 
+def truncated_normal(mean, std, min_, max_, size, n, device="cpu", rng=None):
+    """Sample a Normal distribution truncated to [min_, max_] by inverting its CDF.
+
+    Uniforms are mapped to the CDF range of the interval, so every sample costs
+    the same whatever the acceptance rate of rejection sampling would be. The
+    CDF loses its precision close to 1, so intervals above the mean are
+    sampled from the mirrored distribution, whose CDF values stay close to 0.
+
+    Args:
+        mean: Mean(s), broadcastable to (size, n).
+        std: Standard deviation(s), broadcastable to (size, n).
+        min_: Min value of the support.
+        max_: Max value of the support.
+        size: Number of samples to generate.
+        n: Dimensionality of the samples.
+        device: Torch device.
+        rng: Optional CounterRNG of the samples, torch.rand otherwise.
+    """
+
+    mean = torch.as_tensor(mean, device=device)
+    dtype = mean.dtype if mean.is_floating_point() else torch.get_default_dtype()
+    mean = mean.to(torch.float64).expand(size, n)
+    std = torch.as_tensor(std, dtype=torch.float64, device=device)
+    if rng is not None:
+        u = torch.as_tensor(rng.random(n), device=device)
+    else:
+        u = torch.rand((size, n), dtype=torch.float64, device=device)
+
+    a = (min_ - mean) / std
+    b = (max_ - mean) / std
+    flip = a > 0
+    a, b = torch.where(flip, -b, a), torch.where(flip, -a, b)
+    cdf_a = torch.special.ndtr(a)
+    cdf_b = torch.special.ndtr(b)
+    x = torch.special.ndtri(cdf_a + u * (cdf_b - cdf_a))
+    # intervals too far in the tail for float64 collapse onto the end closest to the mean
+    x = torch.where(cdf_b > cdf_a, torch.minimum(torch.maximum(x, a), b), b)
+    x = torch.where(flip, -x, x)
+
+    return torch.clamp(mean + std * x, min_, max_).to(dtype)
+
+
 def truncated_rejection_resampling(
     sampler_fn: Callable,
     min_: float,
@@ -140,3 +182,151 @@ def truncated_rejection_resampling(
             finished_mask[copy_mask] = True
 
     return result
+
+
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+MASK_64 = (1 << 64) - 1
+
+
+def splitmix64(x):
+    """SplitMix64 hash of (an array of) 64 bit integers."""
+    with np.errstate(over="ignore"):
+        x = np.asarray(x, dtype=np.uint64) + GOLDEN_GAMMA
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class CounterRNG:
+    """Counter-based random numbers for a set of sample indices.
+
+    The numbers drawn for a sample are a hash of (seed, stream, sample index,
+    counter) and do not depend on the other samples, so any subset of the
+    samples of a dataset can be drawn without drawing the ones before it.
+    Streams separate the draws of the different factors and views, the draw
+    number separates the successive candidates of rejection sampling.
+    """
+
+    def __init__(self, seed, indices, key=None):
+        self.indices = np.asarray(indices, dtype=np.uint64)
+        if key is None:
+            if seed < 0:
+                raise ValueError(f"The seed should be a non-negative integer, got {seed}")
+            # fold seeds of any size into 64 bits
+            key = splitmix64(seed & MASK_64)
+            seed >>= 64
+            while seed:
+                key = splitmix64(key ^ np.uint64(seed & MASK_64))
+                seed >>= 64
+        self.key = key
+
+    def __len__(self):
+        return len(self.indices)
+
+    def stream(self, k):
+        """Independent generator for the same samples, e.g. of the k-th factor."""
+        return CounterRNG(None, self.indices, key=splitmix64(self.key ^ splitmix64(k)))
+
+    def streams(self, ks):
+        """Generator drawing column j from stream(ks[j]), to sample several 1-D
+        factors in one call with the numbers they get one by one."""
+        return CounterRNG(None, self.indices, key=splitmix64(self.key ^ splitmix64(np.asarray(ks, dtype=np.uint64))))
+
+    def select(self, rows):
+        """Generator for a subset of the samples, with the same numbers."""
+        return CounterRNG(None, self.indices[rows], key=self.key)
+
+    def random(self, n, draw=0):
+        """(len(indices), n) float64 array of uniforms in (0, 1)."""
+        if np.ndim(self.key):
+            # one stream per column, see streams
+            keys = self.key
+            counters = np.full(n, draw, dtype=np.uint64)
+        else:
+            keys = np.full(n, self.key, dtype=np.uint64)
+            counters = np.uint64(draw * n) + np.arange(n, dtype=np.uint64)
+        rows = splitmix64(keys[None, :] ^ splitmix64(self.indices)[:, None])
+        bits = splitmix64(rows ^ counters[None, :])
+        return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+    def rand(self, n, draw=0, device="cpu"):
+        """Like torch.rand((len(indices), n))."""
+        return torch.as_tensor(self.random(n, draw), dtype=torch.float32, device=device)
+
+    def randn(self, n, draw=0, device="cpu"):
+        """Like torch.randn((len(indices), n)), by the Box-Muller transform."""
+        u1, u2 = self.random(n, 2 * draw), self.random(n, 2 * draw + 1)
+        z = np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+        return torch.as_tensor(z, dtype=torch.float32, device=device)
+
+
+def truncated_counter_resampling(
+    sampler_fn: Callable,
+    min_: float,
+    max_: float,
+    size: int,
+    n: int,
+    device: str = "cpu",
+):
+    """Rejection sampling like truncated_rejection_resampling, for counter-based
+    generators: the candidates of a sample only depend on its own draws.
+
+    Args:
+        sampler_fn: sampler_fn(rows, draw) returns the draw-th candidates of the
+            given rows, as a (len(rows), n) tensor.
+        min_: Min value of the support.
+        max_: Max value of the support.
+        size: Number of samples to generate.
+        n: Dimensionality of the samples.
+        device: Torch device.
+    """
+
+    result = torch.empty((size, n), device=device)
+    finished = torch.zeros((size, n), dtype=torch.bool, device=device)
+    pending = np.arange(size)
+    draw = 0
+    while len(pending):
+        buffer = sampler_fn(pending, draw)
+        # every entry keeps its first feasible candidate
+        copy_mask = (buffer >= min_) & (buffer <= max_) & ~finished[pending]
+        rows = result[pending]
+        rows[copy_mask] = buffer[copy_mask]
+        result[pending] = rows
+        finished[pending] |= copy_mask
+        pending = pending[~finished[pending].all(-1).cpu().numpy()]
+        draw += 1
+
+    return result
+
+
+if __name__ == "__main__":
+    # compare inverse-CDF and rejection sampling of truncated normals in [-1, 1]
+    import timeit
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default=100000, type=int)
+    parser.add_argument("--repeat", default=5, type=int)
+    args = parser.parse_args()
+
+    regimes = {
+        "centered": (0.0, 1.0),
+        "edge mean": (1.0, 1.0),
+        "narrow std": (0.0, 0.01),
+        "edge mean, narrow std": (0.999, 0.01),
+        "mean outside": (1.2, 0.05),
+    }
+    print(f"{'regime':<24}{'icdf [ms]':>11}{'rejection [ms]':>16}{'icdf mean':>11}{'rejection mean':>16}")
+    for name, (mu, sigma) in regimes.items():
+        mean = torch.full((args.size, 1), mu)
+        icdf = lambda: truncated_normal(mean, sigma, -1.0, 1.0, args.size, 1)
+        t_icdf = min(timeit.repeat(icdf, number=1, repeat=args.repeat))
+        line = f"{name:<24}{1000 * t_icdf:>11.2f}"
+        acceptance = float(torch.special.ndtr(torch.tensor((1.0 - mu) / sigma)) - torch.special.ndtr(torch.tensor((-1.0 - mu) / sigma)))
+        if acceptance < 1e-3:
+            # rejection sampling would practically never finish
+            print(f"{line}{'-':>16}{icdf().mean().item():>11.4f}{'-':>16}   acceptance {acceptance:.1e}")
+            continue
+        rejection = lambda: truncated_rejection_resampling(lambda s: torch.randn((s, 1)) * sigma + mean, -1.0, 1.0, args.size, 1)
+        t_rejection = min(timeit.repeat(rejection, number=1, repeat=args.repeat))
+        print(f"{line}{1000 * t_rejection:>16.2f}{icdf().mean().item():>11.4f}{rejection().mean().item():>16.4f}")
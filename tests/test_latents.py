@@ -0,0 +1,23 @@
+import pytest
+
+import generate_clevr_dataset_latents
+
+
+def test_negative_seed_is_rejected():
+    parser = generate_clevr_dataset_latents.get_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--output-folder", "out", "--seed", "-1"])
+    assert parser.parse_args(["--output-folder", "out", "--seed", "0"]).seed == 0
+
+
+def test_configs_of_other_samplers_are_refused(tmp_path):
+    args = generate_clevr_dataset_latents.get_parser().parse_args(
+        ["--output-folder", str(tmp_path), "--position", "--seed", "3"]
+    )
+    config = generate_clevr_dataset_latents.sampling_config(args)
+    views = generate_clevr_dataset_latents.sample_latents(config, [0, 1])
+    assert views["m1"][0].shape[0] == 2
+
+    del config["sampler_version"]
+    with pytest.raises(ValueError):
+        generate_clevr_dataset_latents.sample_latents(config, [0, 1])
@@ -0,0 +1,36 @@
+import os
+
+import render_io
+
+
+def write_image(journal, index):
+    path = journal.image_path(index)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"png")
+    journal.record(index, path, 0.0)
+    return path
+
+
+def test_only_compact_writes_the_index(tmp_path):
+    folder = str(tmp_path / "images")
+    journal = render_io.RenderJournal(folder, writer="batch_0000", fanout=10)
+    paths = {i: write_image(journal, i) for i in range(12)}
+    journal.close()
+    assert render_io.load_index(folder) is None
+    # read from the journal until it is compacted
+    assert render_io.image_paths(folder) == paths
+
+    journal.compact()
+    assert render_io.load_index(folder)["ranges"] == [[0, 12]]
+    assert render_io.image_paths(folder) == paths
+
+
+def test_image_paths_sees_samples_recorded_after_compaction(tmp_path):
+    folder = str(tmp_path / "images")
+    journal = render_io.RenderJournal(folder, writer="batch_0000")
+    write_image(journal, 0)
+    journal.compact()
+    later = render_io.RenderJournal(folder, writer="batch_0001")
+    write_image(later, 1)
+    assert sorted(render_io.image_paths(folder)) == [0, 1]
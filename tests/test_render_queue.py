@@ -0,0 +1,105 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+import render_queue
+import schedule_renders
+# without Blender the script only defines its functions, the scene and the
+# render loop are replaced below
+import generate_clevr_dataset_images as images
+
+
+@pytest.fixture
+def spool(tmp_path):
+    folder = tmp_path / "m1"
+    folder.mkdir()
+    # 15 samples with one object
+    np.save(folder / "latents.npy", np.zeros((15, 3 + 7), dtype=np.float32))
+    spool = str(tmp_path / "spool")
+    render_queue.init_spool(spool)
+    render_queue.submit_range(spool, str(folder / "latents.npy"), 15, 5)
+    return spool
+
+
+def serve_args(spool, worker):
+    return argparse.Namespace(
+        worker_id=worker, daemon_spool=spool, exit_when_empty=True, poll_interval=0.01, output_format="png"
+    )
+
+
+def fake_render(rendered, fail_at=None):
+    """Stand-in for render_indices that records the samples of every job."""
+
+    def render_indices(views, indices, args, scene_cache, writer="main", heartbeat=None):
+        if fail_at is not None and fail_at in indices:
+            raise RuntimeError("render failed")
+        for idx in indices:
+            rendered.append(int(idx))
+            heartbeat()
+        return len(indices)
+
+    return render_indices
+
+
+def backdate_leases(spool, seconds):
+    for path, _, _ in render_queue.list_claimed(spool):
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+
+def test_serve_finishes_every_job(spool, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(images, "make_scene_cache", lambda args: None)
+    monkeypatch.setattr(images, "render_indices", fake_render(rendered))
+    images.serve(serve_args(spool, "w0"))
+
+    assert rendered == list(range(15))
+    assert render_queue.count_jobs(spool, "pending") == 0
+    assert render_queue.count_jobs(spool, "claimed") == 0
+    assert render_queue.count_jobs(spool, "done") == 3
+    assert render_queue.load_worker_stats(spool)[0]["samples"] == 15
+
+
+def test_heartbeat_renews_the_lease(spool, monkeypatch):
+    ages = []
+
+    def render_indices(views, indices, args, scene_cache, writer="main", heartbeat=None):
+        backdate_leases(spool, 100)
+        heartbeat()
+        ages.extend(age for _, _, age in render_queue.list_claimed(spool))
+        return len(indices)
+
+    monkeypatch.setattr(images, "make_scene_cache", lambda args: None)
+    monkeypatch.setattr(images, "render_indices", render_indices)
+    images.serve(serve_args(spool, "w0"))
+    assert len(ages) == 3 and max(ages) < 10
+
+
+def test_jobs_of_a_failed_worker_are_handed_out_again(spool, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(images, "make_scene_cache", lambda args: None)
+    monkeypatch.setattr(images, "render_indices", fake_render(rendered, fail_at=7))
+    with pytest.raises(RuntimeError):
+        images.serve(serve_args(spool, "w0"))
+    # the failed job is neither done nor pending until its lease expires
+    assert render_queue.count_jobs(spool, "done") == 1
+    assert [worker for _, worker, _ in render_queue.list_claimed(spool)] == ["w0"]
+
+    args = argparse.Namespace(spool=spool, lease_timeout=60.0)
+    assert schedule_renders.reissue_leases(args, {}) == 0
+    backdate_leases(spool, 120)
+    assert schedule_renders.reissue_leases(args, {}) == 1
+    assert render_queue.count_jobs(spool, "pending") == 2
+
+    monkeypatch.setattr(images, "render_indices", fake_render(rendered))
+    images.serve(serve_args(spool, "w1"))
+    assert sorted(rendered) == list(range(15))
+    assert render_queue.count_jobs(spool, "done") == 3
+
+
+def test_invalid_material_names_are_rejected():
+    assert images.resolve_material_names(["Metallic"], 2) == ["Metallic", "Metallic"]
+    with pytest.raises(ValueError):
+        images.resolve_material_names(["Rubber", "Rubber"], 3)
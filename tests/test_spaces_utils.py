@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from spaces_utils import CounterRNG
+
+
+def test_counter_rng_does_not_depend_on_other_samples():
+    a = CounterRNG(1, np.arange(10)).stream(3).random(5)
+    b = CounterRNG(1, np.arange(4, 8)).stream(3).random(5)
+    np.testing.assert_array_equal(a[4:8], b)
+
+
+def test_counter_rng_folds_large_seeds():
+    a = CounterRNG(2**70 + 1, np.arange(4)).random(2)
+    b = CounterRNG(1, np.arange(4)).random(2)
+    assert not np.array_equal(a, b)
+
+
+def test_counter_rng_rejects_negative_seeds():
+    with pytest.raises(ValueError):
+        CounterRNG(-1, np.arange(4))
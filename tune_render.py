@@ -0,0 +1,186 @@
+"""Find the number of Blender workers, Cycles threads per worker and tile size
+that render the most images per second on this machine.
+
+A short calibration set taken from the given latents is rendered under every
+(processes x threads x tile size) combination of the grid. Every process
+renders the whole calibration set into its own folder, pinned to its own block
+of cores. Only the images after the first one are timed, from the timing log of
+every process, so that Blender start-up, loading the assets and building the
+first scene are not counted; the throughput of the processes is summed. The
+best configuration is written to render_tuning.json, which schedule_renders.py
+reads to start its workers.
+
+python tune_render.py --blender ${BLENDER_DIR} --latents example/m1 --processes 1 2 4 8 --threads 0 2 4 8 --tile-sizes 16 32 64 -- --quality preview
+"""
+
+import os
+import json
+import shutil
+import argparse
+import itertools
+import subprocess
+import tempfile
+import numpy as np
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generate_clevr_dataset_images.py")
+# images rendered by every process before the timed ones
+WARMUP_IMAGES = 1
+
+
+def core_sets(n_processes, n_threads):
+    """Split the cores usable by this process into one contiguous block of
+    n_threads cores per worker, so that the threads of a worker share caches
+    and usually a NUMA domain. Returns None if the workers cannot be pinned."""
+    cores = sorted(os.sched_getaffinity(0))
+    if n_threads <= 0 or n_processes * n_threads > len(cores):
+        return None
+    return [cores[i * n_threads:(i + 1) * n_threads] for i in range(n_processes)]
+
+
+def pin_to(cores):
+    """preexec_fn pinning a child process to the given cores."""
+    if cores is None:
+        return None
+    return lambda: os.sched_setaffinity(0, cores)
+
+
+def render_command(blender, output_folder, threads, tile_size, worker_args, timing_log):
+    return [
+        blender,
+        "-noaudio",
+        "--background",
+        "--python",
+        SCRIPT,
+        "--output-folder",
+        output_folder,
+        "--n-batches",
+        "1",
+        "--threads",
+        str(threads),
+        "--tile-size",
+        str(tile_size),
+        "--timing-log",
+        timing_log,
+    ] + worker_args
+
+
+def render_rate(timing_log):
+    """Images per second of a process after its warm-up images, from the times
+    at which its samples were done. Returns None if too few were logged."""
+    with open(timing_log) as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r["time"])
+    if len(records) <= WARMUP_IMAGES:
+        return None
+    start = records[WARMUP_IMAGES - 1]["time"]
+    n_images = sum(r.get("frames", 1) for r in records[WARMUP_IMAGES:])
+    return n_images / max(records[-1]["time"] - start, 1e-9)
+
+
+def measure(args, latents, processes, threads, tile_size):
+    """Render the calibration set with every process and return the aggregate
+    images per second after the warm-up images, or None if a process failed."""
+    folder = tempfile.mkdtemp(prefix="tune_", dir=args.work_dir)
+    cores = core_sets(processes, threads) or [None] * processes
+    workers = []
+    for i in range(processes):
+        output_folder = os.path.join(folder, f"p{i}")
+        os.makedirs(output_folder)
+        np.save(os.path.join(output_folder, "latents.npy"), latents)
+        log = open(os.path.join(folder, f"p{i}.log"), "w")
+        workers.append(
+            subprocess.Popen(
+                render_command(
+                    args.blender,
+                    output_folder,
+                    threads,
+                    tile_size,
+                    args.worker_args,
+                    os.path.join(folder, f"p{i}.timings.jsonl"),
+                ),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                preexec_fn=pin_to(cores[i]),
+            )
+        )
+    failed = [process.wait() != 0 for process in workers]
+    rates = [None if f else render_rate(os.path.join(folder, f"p{i}.timings.jsonl")) for i, f in enumerate(failed)]
+    if any(rate is None for rate in rates):
+        print(f"  failed, see the logs in {folder}")
+        return None
+    shutil.rmtree(folder)
+    return sum(rates)
+
+
+def main(args):
+    latents = args.latents
+    if os.path.isdir(latents):
+        latents = os.path.join(latents, "latents.npy")
+    latents = np.load(latents, mmap_mode="r")[: WARMUP_IMAGES + args.n_samples]
+    n_cores = len(os.sched_getaffinity(0))
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    results = []
+    for processes, threads, tile_size in itertools.product(args.processes, args.threads, args.tile_sizes):
+        if processes * max(threads, 1) > n_cores:
+            continue
+        # several workers using all cores each are never started, see schedule_renders.share_cores
+        if processes > 1 and threads == 0:
+            continue
+        print(f"{processes} processes x {threads or 'all'} threads, tile size {tile_size}")
+        images_per_second = measure(args, latents, processes, threads, tile_size)
+        if images_per_second is None:
+            continue
+        print(f"  {images_per_second:.3f} images/s")
+        results.append(
+            {
+                "processes": processes,
+                "threads": threads,
+                "tile_size": tile_size,
+                "pinned": core_sets(processes, threads) is not None,
+                "images_per_second": images_per_second,
+            }
+        )
+    if not results:
+        raise RuntimeError("No configuration could be measured")
+
+    best = max(results, key=lambda r: r["images_per_second"])
+    tuning = {
+        "host": os.uname().nodename,
+        "cores": n_cores,
+        "n_samples": len(latents) - WARMUP_IMAGES,
+        "worker_args": args.worker_args,
+        "best": best,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(tuning, f, indent=1)
+    print(
+        f"Best: {best['processes']} processes x {best['threads'] or 'all'} threads, "
+        f"tile size {best['tile_size']}: {best['images_per_second']:.3f} images/s, saved to {args.output}"
+    )
+    return tuning
+
+
+def load_tuning(path):
+    """Return the best configuration of a tuning file, or None if it does not exist."""
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["best"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blender", default="blender", type=str)
+    parser.add_argument("--latents", required=True, type=str)
+    parser.add_argument("--n-samples", default=32, type=int)
+    parser.add_argument("--processes", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--threads", nargs="+", type=int, default=[0, 2, 4])
+    parser.add_argument("--tile-sizes", nargs="+", type=int, default=[16, 32, 64])
+    parser.add_argument("--work-dir", default="tuning", type=str)
+    parser.add_argument("--output", default="render_tuning.json", type=str)
+    parser.add_argument("worker_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.worker_args[:1] == ["--"]:
+        args.worker_args = args.worker_args[1:]
+    main(args)